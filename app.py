@@ -2,11 +2,17 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
+import calendar
+import hmac
 import json
 import sys
+from datetime import date, datetime, time, timedelta
 import dateutil.parser
 import babel
-from flask import (Flask, render_template, request, flash, redirect, url_for)
+import babel.dates
+from functools import lru_cache
+from flask import (Flask, Response, render_template, request, flash, redirect, url_for, stream_with_context,
+                   abort, jsonify)
 import logging
 from logging import Formatter, FileHandler
 from sqlalchemy import func
@@ -15,6 +21,19 @@ from forms import *
 from flask_moment import Moment
 from flask_migrate import Migrate
 from models import db, Venue, Artist, Show
+import queries
+import commands
+from pagination import page_url
+from cache import response_cache, conditional, namespace
+import counters
+import exporter
+from instrumentation import query_instrumentation, instrument_engine
+from directory import venue_directory_refresher
+import geocoding
+from importer import insert_shows
+from assets import assets
+from replicas import replica_router
+from autocomplete import autocomplete
 from flask_wtf.csrf import CSRFProtect
 
 
@@ -29,6 +48,15 @@ moment = Moment(app)
 db.init_app(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
+commands.init_app(app)
+response_cache.init_app(app)
+query_instrumentation.init_app(app)
+venue_directory_refresher.init_app(app)
+assets.init_app(app)
+replica_router.init_app(app)
+autocomplete.init_app(app)
+for engine in replica_router.engines:
+    instrument_engine(engine)
 
 
 # Completed: connect to a local postgresql database
@@ -38,16 +66,43 @@ csrf = CSRFProtect(app)
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def _datetime_pattern(format, locale):
+    # babel pattern and locale, parsed once per format/locale pair
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+    # listings repeat the same start times many times, so memoize the output
+    pattern, locale = _datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    # routes pass datetime objects; strings are still parsed for compatibility
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return _format_datetime(value, format, locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.globals['page_url'] = page_url
+
+
+def stream_template(template_name, **context):
+    # render a template incrementally; rows reach the client as they are rendered
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+    return stream
 
 
 # ----------------------------------------------------------------------------#
@@ -62,31 +117,29 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
+def _venue_listing_version():
+    # the directory is brought up to date before its version is taken, or a
+    # stale snapshot would keep answering 304. A refresh and every venue or show
+    # write invalidate the 'venues' namespace, so its token covers all genres.
+    venue_directory_refresher.ensure_fresh()
+    return response_cache.listing_version('venues')
+
+
 @app.route('/venues')
+@conditional(_venue_listing_version)
+@response_cache.cached
 def venues():
     # Completed : replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
 
-    # initiate regions list to populate it with venues per state, city
-    regions = []
-    # get all venues
-    venues = Venue.query.all()
-    # get all venues that has distinct city, state
-    places = Venue.query.distinct(Venue.city, Venue.state).all()
-    # Nested loop: 1- append distinct city, state
-    #              2- take that distinct city, state and grab their venues from venues query
-    for place in places:
-        regions.append({
-            'city': place.city,
-            'state': place.state,
-            'venues': [{
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': len([show for show in venue.shows if show.start_time > datetime.now()])
-            } for venue in venues if
-                venue.city == place.city and venue.state == place.state]
-        })
-    return render_template('pages/venues.html', areas=regions)
+    # venues grouped by city, state from the materialized directory; in
+    # stale-while-refresh mode a stale directory is refreshed in the background
+    venue_directory_refresher.ensure_fresh()
+    genre = request.args.get('genre')
+    regions, page = queries.venue_regions(request.args.get('cursor'), app.config['LISTING_PAGE_SIZE'], genre)
+    return render_template('pages/venues.html', areas=regions, page=page,
+                           genre=genre, genre_counts=response_cache.memoize(
+                               namespace('venues'), 'genre_counts', lambda: queries.genre_counts(Venue)))
 
 
 @app.route('/venues/search', methods=['POST'])
@@ -96,15 +149,14 @@ def search_venues():
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
     search_term = request.form.get('search_term', '')
-    venues_result = db.session.query(Venue).filter(Venue.name.ilike(f'%{search_term}%')).all()
+    venues_result = queries.name_search(Venue, search_term, app.config['SEARCH_RESULT_LIMIT'])
     data = []
 
     for venue in venues_result:
       data.append({
         "id": venue.id,
         "name": venue.name,
-        "num_upcoming_shows":db.session.query(db.func.count(Show.venue_id == venue.id)).filter(
-                        Show.start_time > datetime.now()).all(),
+        "num_upcoming_shows": venue.upcoming_shows_count,
       })
 
     response = {
@@ -122,59 +174,54 @@ def search_venues():
     return render_template('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
+@app.route('/venues/nearby')
+def nearby_venues():
+    # ?lat=&lon= or ?city=&state=, with optional radius_km and limit
+    try:
+        if request.args.get('lat') or request.args.get('lon'):
+            latitude, longitude = float(request.args['lat']), float(request.args['lon'])
+        else:
+            latitude, longitude = geocoding.geocode(request.args.get('city'), request.args.get('state'))
+        radius_km = float(request.args.get('radius_km', app.config['NEARBY_DEFAULT_RADIUS_KM']))
+        limit = int(request.args.get('limit', app.config['NEARBY_RESULT_LIMIT']))
+    except (KeyError, ValueError):
+        abort(400)
+    if latitude is None or not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        abort(400)
+    radius_km = min(max(radius_km, 0), app.config['NEARBY_MAX_RADIUS_KM'])
+    limit = min(max(limit, 1), app.config['NEARBY_RESULT_LIMIT'])
+
+    venues_result = queries.nearby_venues(latitude, longitude, radius_km, limit)
+    return jsonify({
+        'origin': {'latitude': latitude, 'longitude': longitude},
+        'radius_km': radius_km,
+        'count': len(venues_result),
+        'data': [{
+            'id': venue.id,
+            'name': venue.name,
+            'city': venue.city,
+            'state': venue.state,
+            'latitude': venue.latitude,
+            'longitude': venue.longitude,
+            'num_upcoming_shows': venue.upcoming_shows_count,
+            'distance_km': round(venue.distance_km, 2),
+        } for venue in venues_result],
+    })
+
+
 @app.route('/venues/<int:venue_id>', methods=['GET'])
+@conditional(queries.venue_version)
+@response_cache.cached
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # Completed: replace with real venue data from the venues table, using venue_id
-    venue = Venue.query.get(venue_id)
+    # the venue row plus its shows partitioned into past/upcoming, in two queries
+    data = queries.venue_detail(venue_id)
 
-    if not venue:
+    if not data:
       return render_template('errors/404.html')
 
-    else:
-      upcoming_shows_query = db.session.query(Show).join(Artist).filter( Artist.id == Show.artist_id).filter(
-        Show.start_time > datetime.now()).all()
-      upcoming_shows = []
-
-      past_shows_query = db.session.query(Show).join(Artist).filter(Artist.id == Show.artist_id).filter(
-        Show.start_time < datetime.now()).all()
-      past_shows = []
-
-      for show in past_shows_query:
-        past_shows.append({
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-      for show in upcoming_shows_query:
-        upcoming_shows.append({
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-      data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres,
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-      }
-      return render_template('pages/show_venue.html', venue=data)
+    return render_template('pages/show_venue.html', venue=data)
 
 
 #  Create Venue
@@ -260,12 +307,21 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
+def _artist_listing_version():
+    return response_cache.listing_version('artists')
+
+
 @app.route('/artists')
+@conditional(_artist_listing_version)
+@response_cache.cached
 def artists():
     # Completed: replace with real data returned from querying the database
-    data = db.session.query(Artist).all()
+    genre = request.args.get('genre')
+    page = queries.artist_listing(request.args.get('cursor'), app.config['LISTING_PAGE_SIZE'], genre)
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=page.items, page=page,
+                           genre=genre, genre_counts=response_cache.memoize(
+                               namespace('artists'), 'genre_counts', lambda: queries.genre_counts(Artist)))
 
 
 #  Create Artist
@@ -333,15 +389,14 @@ def create_artist_submission():
 def search_artists():
     # Completed: implement search on artists with partial string search. Ensure it is case-insensitive.
     search_term = request.form.get('search_term', '')
-    artist_result = db.session.query(Artist).filter(Artist.name.ilike(f'%{search_term}%')).all()
+    artist_result = queries.name_search(Artist, search_term, app.config['SEARCH_RESULT_LIMIT'])
     data = []
 
     for artist in artist_result:
         data.append({
             "id": artist.id,
             "name": artist.name,
-            "num_upcoming_shows": len(db.session.query(Show).filter(Show.artist_id == artist.id).filter(
-                Show.start_time > datetime.now()).all()),
+            "num_upcoming_shows": artist.upcoming_shows_count,
         })
 
     response = {
@@ -353,55 +408,17 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional(queries.artist_version)
+@response_cache.cached
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # Completed: replace with real venue data from the venues table, using venue_id
-    artist = db.session.query(Artist).get(artist_id)
+    # the artist row plus its shows partitioned into past/upcoming, in two queries
+    data = queries.artist_detail(artist_id)
 
-    if not artist:
+    if not data:
         return render_template('errors/404.html')
 
-    past_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(
-        Show.start_time < datetime.now()).all()
-    past_shows = []
-    # populating past shows list
-    for show in past_shows_query:
-        past_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-    upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(
-        Show.start_time > datetime.now()).all()
-    upcoming_shows = []
-    # populating upcoming shows list
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link":artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
     return render_template('pages/show_artist.html', artist=data)
 
 
@@ -529,26 +546,70 @@ def edit_venue_submission(venue_id):
 #  Shows
 #  ----------------------------------------------------------------
 
+def _window_bound(name, inclusive_date=False):
+    # ?from=/?to= accept a date or a date and time; a bare date given as the
+    # end of the window includes that whole day
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.combine(date.fromisoformat(value), time.min) + timedelta(days=1 if inclusive_date else 0)
+    except ValueError:
+        pass
+    try:
+        return dateutil.parser.parse(value)
+    except (ValueError, OverflowError):
+        abort(400)
+
+
+def _show_window():
+    window = {
+        'start': _window_bound('from'),
+        'end': _window_bound('to', inclusive_date=True),
+    }
+    for name in ('venue_id', 'artist_id'):
+        window[name] = request.args.get(name, type=int)
+    return window
+
+
 @app.route('/shows')
+@response_cache.cached
 def shows():
     # displays list of shows at /shows
     # Completed: replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
 
-    shows_data = db.session.query(Show).join(Artist).join(Venue).all()
+    window = _show_window()
+    if app.config['SHOWS_STREAMING']:
+        # stream every show straight from a server-side cursor into the template
+        shows_data = queries.iter_show_listing(app.config['STREAM_BATCH_SIZE'], window)
+        return Response(stream_with_context(stream_template('pages/shows.html', shows=shows_data)))
 
-    data = []
-    for show in shows_data:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
+    page = queries.show_listing(request.args.get('cursor'), app.config['LISTING_PAGE_SIZE'], window)
+
+    return render_template('pages/shows.html', shows=page.items, page=page)
 
-    return render_template('pages/shows.html', shows=data)
+
+@app.route('/shows/calendar')
+@response_cache.cached
+def show_calendar():
+    # month grid of show counts per day, ?month=YYYY-MM&venue_id=&artist_id=
+    try:
+        month = datetime.strptime(request.args.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = date.today().replace(day=1)
+    weeks = calendar.Calendar(firstweekday=6).monthdatescalendar(month.year, month.month)
+
+    window = _show_window()
+    window['start'] = datetime.combine(weeks[0][0], time.min)
+    window['end'] = datetime.combine(weeks[-1][-1] + timedelta(days=1), time.min)
+    counts = queries.show_day_counts(window)
+
+    previous_month = (month - timedelta(days=1)).replace(day=1)
+    next_month = (month + timedelta(days=31)).replace(day=1)
+    return render_template('pages/shows_calendar.html', month=month, weeks=weeks, counts=counts,
+                           previous_month=previous_month, next_month=next_month,
+                           venue_id=window.get('venue_id'), artist_id=window.get('artist_id'))
 
 
 @app.route('/shows/create')
@@ -596,6 +657,137 @@ def create_show_submission():
         return render_template('pages/home.html')
 
 
+@app.route('/shows/create/batch')
+def create_show_batch_form():
+    form = BatchShowForm(csrf_enabled=False)
+    return render_template('forms/new_show_batch.html', form=form)
+
+
+@app.route('/shows/create/batch', methods=['POST'])
+def create_show_batch_submission():
+    # a schedule and/or a recurring show, created in one transaction; rows with
+    # bad input or unknown artists/venues are listed and the others still created
+    form = BatchShowForm(request.form, csrf_enabled=False)
+    if not form.validate():
+        return render_template('forms/new_show_batch.html', form=form)
+
+    rows = form.rows(app.config['SHOW_BATCH_MAX_ROWS'])
+    errors = [(row['label'], row['error']) for row in rows if 'error' in row]
+    valid = [row for row in rows if 'error' not in row]
+    created = []
+    if valid:
+        try:
+            created, rejected = insert_shows(valid)
+            errors.extend((row['label'], reason) for row, reason in rejected)
+        except:
+            db.session.rollback()
+            print(sys.exc_info())
+            flash('An error occurred. Shows could not be listed.')
+            return render_template('forms/new_show_batch.html', form=form)
+        finally:
+            db.session.close()
+        if created:
+            # the multi-row insert bypasses the ORM events the directory listens to
+            venue_directory_refresher.mark_dirty()
+            flash(f'{len(created)} show{"s were" if len(created) != 1 else " was"} successfully listed!')
+    return render_template('forms/new_show_batch.html', form=form, created=created, errors=errors)
+
+
+#  Faceted search
+#  ----------------------------------------------------------------
+
+def _faceted_search(model, seeking_column):
+    seeking = request.args.get('seeking')
+    if seeking not in (None, '', 'true', 'false'):
+        abort(400)
+    filters = {
+        'state': request.args.get('state'),
+        'city': request.args.get('city'),
+        'genre': request.args.get('genre'),
+        'seeking': None if not seeking else seeking == 'true',
+    }
+    count, results, facets = queries.faceted_search(
+        model, seeking_column, request.args.get('q'), filters, app.config['SEARCH_RESULT_LIMIT'])
+    return jsonify({
+        'count': count,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'city': row.city,
+            'state': row.state,
+            'genres': row.genres,
+            seeking_column.key: getattr(row, seeking_column.key),
+            'num_upcoming_shows': row.upcoming_shows_count,
+        } for row in results],
+        'facets': facets,
+    })
+
+
+@app.route('/api/venues/search')
+def faceted_search_venues():
+    # ?q=&state=&city=&genre=&seeking=true|false
+    return _faceted_search(Venue, Venue.seeking_talent)
+
+
+@app.route('/api/artists/search')
+def faceted_search_artists():
+    # ?q=&state=&city=&genre=&seeking=true|false
+    return _faceted_search(Artist, Artist.seeking_venue)
+
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+AUTOCOMPLETE_KINDS = {'venue': 'show_venue', 'artist': 'show_artist'}
+
+
+@app.route('/autocomplete')
+def autocomplete_names():
+    # ?q=&kind=venue|artist&limit=, answered from the in-memory name index
+    kind = request.args.get('kind')
+    if kind and kind not in AUTOCOMPLETE_KINDS:
+        abort(400)
+    limit = min(max(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int), 1),
+                app.config['AUTOCOMPLETE_LIMIT'])
+    matches = autocomplete.search(request.args.get('q', ''), limit, kind)
+    return jsonify({
+        'data': [{
+            'type': match_kind,
+            'id': entity_id,
+            'name': name,
+            'url': url_for(AUTOCOMPLETE_KINDS[match_kind], **{f'{match_kind}_id': entity_id}),
+        } for match_kind, entity_id, name in matches],
+    })
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<model_name>')
+def export_data(model_name):
+    # streams a full or incremental dump of one model for partners
+    token = app.config['EXPORT_API_TOKEN']
+    if not token or not hmac.compare_digest(
+            request.headers.get('Authorization', '').encode('utf-8'), ('Bearer ' + token).encode('utf-8')):
+        abort(401)
+    if model_name not in exporter.EXPORTS:
+        abort(404)
+
+    format = request.args.get('format', 'csv')
+    if format not in exporter.FORMATS:
+        abort(400)
+    updated_since = request.args.get('updated_since')
+    if updated_since:
+        try:
+            updated_since = dateutil.parser.parse(updated_since)
+        except (ValueError, OverflowError):
+            abort(400)
+
+    chunks = exporter.export(model_name, format, updated_since or None)
+    return Response(stream_with_context(chunks), mimetype=exporter.FORMATS[format],
+                    headers={'Content-Disposition': f'attachment; filename={model_name}.{format}'})
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import brotli
+from flask import abort, request, send_file, url_for
+
+
+# ----------------------------------------------------------------------------#
+# Static asset pipeline.
+# ----------------------------------------------------------------------------#
+
+# bundles built from files under static/, in load order
+BUNDLES = {
+    'css/site.css': (
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ),
+    'js/head.js': (
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ),
+    'js/site.js': (
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ),
+}
+# served as they are, apart from the fingerprint
+COPIED = (
+    'fonts',
+    'img',
+    'ico',
+    'js/libs/jquery-1.11.1.min.js',
+    'js/libs/respond-1.4.2.min.js',
+)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.map', '.eot', '.ttf', '.otf')
+# (Accept-Encoding token, file suffix) in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+def _fingerprint(path, content):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def minify_css(css):
+    # comments and insignificant whitespace only; selectors and values are left alone
+    css = CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def _rewrite_css_urls(css, source, bundle, manifest):
+    # references are relative to the source file; point them at the fingerprinted
+    # copy, relative to where the bundle ends up. Unknown targets are left as they are.
+    def replace(match):
+        quote, reference = match.groups()
+        target, separator, suffix = _split_reference(reference)
+        if target.startswith(('data:', 'http:', 'https:', '/')):
+            return match.group(0)
+        path = os.path.normpath(os.path.join(os.path.dirname(source), target)).replace(os.sep, '/')
+        if path not in manifest:
+            return match.group(0)
+        relative = os.path.relpath(manifest[path], os.path.dirname(bundle)).replace(os.sep, '/')
+        return f'url({quote}{relative}{separator}{suffix}{quote})'
+    return CSS_URL.sub(replace, css)
+
+
+def _split_reference(reference):
+    # "font.eot?#iefix" -> ("font.eot", "?", "#iefix")
+    match = re.search(r'[?#]', reference)
+    if not match:
+        return reference, '', ''
+    return reference[:match.start()], match.group(0), reference[match.end():]
+
+
+class AssetBuilder(object):
+
+    def __init__(self, static_folder, output_folder, report=print):
+        self.static_folder = static_folder
+        self.output_folder = output_folder
+        self.report = report
+        self.manifest = {}
+
+    def _write(self, logical_path, content):
+        hashed = _fingerprint(logical_path, content)
+        target = os.path.join(self.output_folder, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+        if target.endswith(COMPRESSIBLE):
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, 9))
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+        self.manifest[logical_path] = hashed
+        return hashed
+
+    def _copied_files(self):
+        for entry in COPIED:
+            path = os.path.join(self.static_folder, entry)
+            if os.path.isfile(path):
+                yield entry
+            elif os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    for name in sorted(files):
+                        yield os.path.relpath(os.path.join(root, name), self.static_folder).replace(os.sep, '/')
+
+    def _read(self, logical_path):
+        with open(os.path.join(self.static_folder, logical_path), 'rb') as f:
+            return f.read()
+
+    def build(self):
+        shutil.rmtree(self.output_folder, ignore_errors=True)
+
+        # copies first, so the bundles can refer to their fingerprinted names
+        for logical_path in self._copied_files():
+            self._write(logical_path, self._read(logical_path))
+
+        for bundle, sources in BUNDLES.items():
+            parts = []
+            for source in sources:
+                content = self._read(source).decode('utf-8')
+                if bundle.endswith('.css'):
+                    content = minify_css(_rewrite_css_urls(content, source, bundle, self.manifest))
+                else:
+                    # scripts are concatenated as they are; the vendored ones are
+                    # already minified. The separator stops a missing trailing
+                    # semicolon from joining two files into one statement.
+                    content = content.rstrip() + '\n;'
+                parts.append(content)
+            hashed = self._write(bundle, '\n'.join(parts).encode('utf-8'))
+            self.report(f'{bundle} -> {hashed}')
+
+        with open(os.path.join(self.output_folder, 'manifest.json'), 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        return self.manifest
+
+
+class Assets(object):
+    # serves the output of "flask build-assets": asset_url() in templates maps a
+    # logical path (css/site.css) to its fingerprinted name through the manifest,
+    # and /assets/ answers with the precompressed variant the client accepts and
+    # a far-future immutable lifetime, since a changed file gets a new name.
+    # Without a manifest (development) both helpers fall back to /static/.
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_FOLDER', os.path.join(app.static_folder, 'dist'))
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 60 * 60)
+        self.folder = app.config['ASSETS_FOLDER']
+        self.max_age = app.config['ASSETS_MAX_AGE']
+
+        manifest_path = os.path.join(self.folder, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            app.logger.info('no asset manifest at %s, serving assets from /static', manifest_path)
+
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send_asset)
+        app.add_template_global(self.asset_url)
+        app.add_template_global(self.bundle_urls)
+
+    def asset_url(self, path):
+        hashed = self.manifest.get(path)
+        if hashed is None:
+            return url_for('static', filename=path)
+        return url_for('assets', filename=hashed)
+
+    def bundle_urls(self, bundle):
+        # the built bundle, or its separate sources when it hasn't been built
+        if bundle in self.manifest:
+            return [self.asset_url(bundle)]
+        return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+    def send_asset(self, filename):
+        path = os.path.normpath(os.path.join(self.folder, filename))
+        if not path.startswith(os.path.join(self.folder, '')) or not os.path.isfile(path):
+            abort(404)
+
+        encoding = None
+        for token, suffix in ENCODINGS:
+            if token in request.accept_encodings and os.path.isfile(path + suffix):
+                encoding = token
+                path += suffix
+                break
+
+        # the mimetype comes from the original name, not the .gz/.br variant
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_file(path, mimetype=mimetype, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        return response
+
+
+assets = Assets()
@@ -0,0 +1,185 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from models import db, Venue, Artist
+
+
+# ----------------------------------------------------------------------------#
+# Name autocomplete.
+# ----------------------------------------------------------------------------#
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+WORD_START = re.compile(r'(?:^|(?<=\W))\w', re.UNICODE)
+
+
+def _keys(name):
+    # every word start of the name, so "hop" finds "The Musical Hop" too
+    folded = name.casefold()
+    return {folded[match.start():] for match in WORD_START.finditer(folded)} or {folded}
+
+
+def _apply(entries, names, kind, entity_id, name):
+    # puts (or with name None, removes) one entity in entries and names in place
+    old = names.pop((kind, entity_id), None)
+    if old is not None:
+        for key in _keys(old):
+            position = bisect_left(entries, (key, kind, entity_id))
+            if position < len(entries) and entries[position] == (key, kind, entity_id):
+                del entries[position]
+    if name is not None:
+        names[kind, entity_id] = name
+        for key in _keys(name):
+            insort(entries, (key, kind, entity_id))
+
+
+class PrefixIndex(object):
+    # a sorted array of (key, kind, id) with one key per word start of each
+    # name; a prefix lookup is a bisect to the first key >= the prefix and a
+    # walk while keys still start with it. Writes change the array in place and
+    # searches walk it, both under the lock; a search is a few dozen steps, so
+    # it is held briefly.
+
+    def __init__(self):
+        self._entries = []
+        self._names = {}
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self, read_rows):
+        # read_rows() returns (kind, id, name) rows. It may read the database
+        # before changes that are put while it runs, so those are recorded and
+        # replayed on top of its rows.
+        with self._lock:
+            self._pending = []
+        try:
+            names = {(kind, entity_id): name for kind, entity_id, name in read_rows()}
+            entries = sorted((key, kind, entity_id) for (kind, entity_id), name in names.items() for key in _keys(name))
+            with self._lock:
+                for change in self._pending:
+                    _apply(entries, names, *change)
+                self._entries = entries
+                self._names = names
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def put(self, kind, entity_id, name):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((kind, entity_id, name))
+            _apply(self._entries, self._names, kind, entity_id, name)
+
+    def remove(self, kind, entity_id):
+        self.put(kind, entity_id, None)
+
+    def search(self, prefix, limit, kind=None):
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            entries = self._entries
+            position = bisect_left(entries, (prefix,))
+            while position < len(entries) and len(results) < limit:
+                key, entry_kind, entity_id = entries[position]
+                if not key.startswith(prefix):
+                    break
+                position += 1
+                if (kind and entry_kind != kind) or (entry_kind, entity_id) in seen:
+                    continue
+                seen.add((entry_kind, entity_id))
+                results.append((entry_kind, entity_id, self._names[entry_kind, entity_id]))
+        return results
+
+
+class Autocomplete(object):
+    # keeps a PrefixIndex of venue and artist names in memory. It is loaded on
+    # the first request and follows commits made in this process through the
+    # model events; writes from other processes (bulk imports, other workers)
+    # are picked up by a background reload once AUTOCOMPLETE_MAX_AGE seconds
+    # have passed.
+
+    def __init__(self, app=None):
+        self.index = PrefixIndex()
+        self._loaded_at = None
+        self._reloading = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTOCOMPLETE_LIMIT', 10)
+        app.config.setdefault('AUTOCOMPLETE_MAX_AGE', 300)
+        self.app = app
+        self.max_age = app.config['AUTOCOMPLETE_MAX_AGE']
+
+        app.before_first_request(self.load)
+        for model in KINDS:
+            event.listen(model, 'after_insert', _record_name)
+            event.listen(model, 'after_update', _record_name)
+            event.listen(model, 'after_delete', _record_removal)
+        event.listen(db.session, 'after_commit', self._apply_changes)
+        event.listen(db.session, 'after_rollback', _discard_changes)
+
+    def load(self):
+        self.index.load(self._read_rows)
+        self._loaded_at = time.monotonic()
+
+    def _read_rows(self):
+        rows = []
+        for model, kind in KINDS.items():
+            rows.extend((kind, entity_id, name) for entity_id, name in
+                        db.session.query(model.id, model.name).filter(model.name.isnot(None)))
+        return rows
+
+    def _reload_in_background(self):
+        try:
+            with self.app.app_context():
+                self.load()
+        except Exception:
+            self.app.logger.exception('autocomplete reload failed')
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def search(self, prefix, limit, kind=None):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at > self.max_age:
+            with self._lock:
+                start = not self._reloading
+                self._reloading = True
+            if start:
+                threading.Thread(target=self._reload_in_background, daemon=True).start()
+        return self.index.search(prefix, limit, kind)
+
+    def _apply_changes(self, db_session):
+        for kind, entity_id, name in db_session.info.pop('autocomplete_changes', ()):
+            if name is None:
+                self.index.remove(kind, entity_id)
+            else:
+                self.index.put(kind, entity_id, name)
+
+
+def _changes(target):
+    return object_session(target).info.setdefault('autocomplete_changes', [])
+
+
+def _record_name(mapper, connection, target):
+    _changes(target).append((KINDS[type(target)], target.id, target.name or None))
+
+
+def _record_removal(mapper, connection, target):
+    _changes(target).append((KINDS[type(target)], target.id, None))
+
+
+def _discard_changes(db_session):
+    db_session.info.pop('autocomplete_changes', None)
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,3 @@
+# Benchmark suite: `python -m benchmarks.seed` fills a database with synthetic
+# venues, artists and shows, `python -m benchmarks.run` drives the routes and
+# prints latency, query and memory figures as JSON.
@@ -0,0 +1,154 @@
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import gevent
+from gevent.pool import Pool
+
+from benchmarks.run import percentile, git_commit
+
+# ----------------------------------------------------------------------------#
+# Concurrency benchmark.
+# ----------------------------------------------------------------------------#
+
+MODES = {
+    'gevent': [],
+    'threaded': ['--threaded'],
+}
+
+
+def hot_routes(term):
+    # (label, method, path, form) for the listing and search endpoints
+    return [
+        ('venues', 'GET', '/venues', None),
+        ('artists', 'GET', '/artists', None),
+        ('shows', 'GET', '/shows', None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': term}),
+        ('search_artists', 'POST', '/artists/search', {'search_term': term}),
+    ]
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'server on port {port} did not come up within {timeout}s')
+
+
+def client(port, routes, deadline, results, nonce):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    for label, method, path, form in itertools.cycle(routes):
+        if time.monotonic() >= deadline:
+            break
+        # a unique query string per request misses the response cache, so the
+        # run measures the database path
+        url = f'{path}?_={next(nonce)}'
+        body = urlencode(form) if form else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, url, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            ok = False
+        results.append((label, ok, (time.perf_counter() - started) * 1000))
+    connection.close()
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for _, ok, latency in samples if ok)
+    errors = sum(1 for _, ok, _ in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+    }
+
+
+def run_mode(mode, port, args):
+    server = subprocess.Popen([sys.executable, 'serve.py', '--port', str(port)] + MODES[mode],
+                              stdout=subprocess.DEVNULL, env=os.environ.copy())
+    try:
+        wait_for_server(port)
+        routes = hot_routes(args.term)
+        nonce = itertools.count()
+
+        # warm connections, caches of compiled statements and the venue directory
+        warmup = []
+        Pool(args.clients).map(lambda _: client(port, routes, time.monotonic() + args.warmup, warmup, nonce),
+                               range(args.clients))
+
+        samples = []
+        started = time.monotonic()
+        deadline = started + args.duration
+        pool = Pool(args.clients)
+        for _ in range(args.clients):
+            pool.spawn(client, port, routes, deadline, samples, nonce)
+        pool.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = summarize(samples, elapsed)
+    report['routes'] = {
+        label: summarize([sample for sample in samples if sample[0] == label], elapsed)
+        for label, _, _, _ in hot_routes(args.term)
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare throughput of the gevent and thread-per-request servers under concurrent clients.')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured per server mode')
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--term', default='the', help='search term for the search endpoints')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--mode', action='append', choices=sorted(MODES), help='run only these server modes')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    modes = {}
+    for mode in args.mode or sorted(MODES):
+        modes[mode] = run_mode(mode, args.port, args)
+        print(f'{mode}: {modes[mode]["throughput_rps"]} req/s, p99 {modes[mode]["p99_ms"]} ms', file=sys.stderr)
+        gevent.sleep(1)
+
+    report = {
+        'commit': git_commit(),
+        'clients': args.clients,
+        'duration_s': args.duration,
+        'modes': modes,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
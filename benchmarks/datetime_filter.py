@@ -0,0 +1,71 @@
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+
+# ----------------------------------------------------------------------------#
+# `datetime` filter micro-benchmark.
+# ----------------------------------------------------------------------------#
+
+
+def legacy_format_datetime(value, format='medium'):
+    # the filter as it was: parse a string and rebuild the babel pattern per call
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def start_times(rows, distinct, seed=1):
+    # a listing page repeats a limited set of show times, like real evening slots
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1, 18, 0)
+    pool = [base + timedelta(days=rng.randint(0, 365), minutes=30 * rng.randint(0, 10)) for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the datetime Jinja filter per 10k rows.')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--distinct', type=int, default=2000, help='distinct timestamps among the rows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import format_datetime, _format_datetime
+
+    values = start_times(args.rows, args.distinct)
+    strings = [value.strftime('%Y-%m-%d %H:%M:%S') for value in values]
+
+    def legacy():
+        for value in strings:
+            legacy_format_datetime(value, 'full')
+
+    def cold():
+        # compiled patterns only, no memoized output
+        _format_datetime.cache_clear()
+        for value in values:
+            _format_datetime.__wrapped__(value, 'full', babel.dates.LC_TIME)
+
+    def current():
+        for value in values:
+            format_datetime(value, 'full')
+
+    assert legacy_format_datetime(strings[0], 'full') == format_datetime(values[0], 'full')
+
+    scale = 10000.0 / args.rows
+    results = {}
+    for label, fn in (('legacy', legacy), ('compiled_pattern', cold), ('compiled_and_memoized', current)):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        results[label] = {'ms_per_10k_rows': round(best * 1000 * scale, 3)}
+    for label in ('compiled_pattern', 'compiled_and_memoized'):
+        results[label]['speedup'] = round(results['legacy']['ms_per_10k_rows'] / results[label]['ms_per_10k_rows'], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+
+# ----------------------------------------------------------------------------#
+# Route benchmark.
+# ----------------------------------------------------------------------------#
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def percentile(samples, pct):
+    # nearest-rank percentile of an already sorted list
+    if not samples:
+        return None
+    rank = max(int(round(pct / 100.0 * len(samples) + 0.5)) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sample_ids(db, Venue, Artist):
+    venue = db.session.query(Venue.id, Venue.name).order_by(Venue.upcoming_shows_count.desc()).first()
+    artist = db.session.query(Artist.id, Artist.name).order_by(Artist.upcoming_shows_count.desc()).first()
+    db.session.remove()
+    if venue is None or artist is None:
+        raise SystemExit('The database is empty, run "python -m benchmarks.seed" first.')
+    return venue, artist
+
+
+def deep_cursor(client, path, pages):
+    # follow the listing's Next links to get a cursor deep into it
+    cursor = None
+    for _ in range(pages):
+        response = client.get(path, query_string={'cursor': cursor} if cursor else None)
+        match = re.search(r'<li class="next"><a href="[^"]*cursor=([^"&]+)', response.get_data(as_text=True))
+        if not match:
+            break
+        cursor = match.group(1)
+    return cursor
+
+
+def build_requests(client, venue, artist, deep_pages):
+    # (label, method, path, kwargs) for every read route. The create/edit
+    # submissions and DELETE are left out so runs do not change the dataset.
+    requests = [
+        ('index', 'GET', '/', {}),
+        ('venues', 'GET', '/venues', {}),
+        ('artists', 'GET', '/artists', {}),
+        ('shows', 'GET', '/shows', {}),
+        ('shows_window', 'GET', '/shows', {'query_string': {'from': '2030-01-01', 'to': '2030-01-31'}}),
+        ('show_calendar', 'GET', '/shows/calendar', {}),
+        ('show_venue', 'GET', f'/venues/{venue.id}', {}),
+        ('show_artist', 'GET', f'/artists/{artist.id}', {}),
+        ('search_venues', 'POST', '/venues/search', {'data': {'search_term': venue.name.split()[1]}}),
+        ('search_artists', 'POST', '/artists/search', {'data': {'search_term': artist.name.split()[0]}}),
+        ('search_venues_typo', 'POST', '/venues/search', {'data': {'search_term': venue.name[:-3] + 'x'}}),
+        ('create_venue_form', 'GET', '/venues/create', {}),
+        ('create_artist_form', 'GET', '/artists/create', {}),
+        ('create_shows', 'GET', '/shows/create', {}),
+        ('edit_venue', 'GET', f'/venues/{venue.id}/edit', {}),
+        ('edit_artist', 'GET', f'/artists/{artist.id}/edit', {}),
+        ('nearby_venues', 'GET', '/venues/nearby', {'query_string': {'city': 'Austin', 'state': 'TX'}}),
+        ('faceted_search_venues', 'GET', '/api/venues/search', {'query_string': {'state': 'CA', 'genre': 'Rock n Roll'}}),
+        ('autocomplete', 'GET', '/autocomplete', {'query_string': {'q': artist.name[:3]}}),
+        ('faceted_search_artists', 'GET', '/api/artists/search', {'query_string': {'q': artist.name.split()[0]}}),
+    ]
+    for name in ('venues', 'artists', 'shows'):
+        cursor = deep_cursor(client, f'/{name}', deep_pages)
+        if cursor:
+            requests.append((f'{name}_deep', 'GET', f'/{name}', {'query_string': {'cursor': cursor}}))
+    return requests
+
+
+def measure(client, method, path, kwargs, iterations, warmup):
+    for _ in range(warmup):
+        client.open(path, method=method, **kwargs)
+
+    latencies = []
+    queries = []
+    status = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        status = response.status_code
+        match = SERVER_TIMING_QUERIES.search(', '.join(response.headers.getlist('Server-Timing')))
+        if match:
+            queries.append(int(match.group(1)))
+
+    latencies.sort()
+    return {
+        'status': status,
+        'requests': iterations,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every read route through the Flask test client.')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--deep-pages', type=int, default=20, help='pages to walk for the deep pagination cases')
+    parser.add_argument('--with-cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--only', action='append', help='benchmark only these labels')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    from app import app
+    from cache import response_cache, CacheBackend
+    from models import db, Venue, Artist, Show
+
+    if not args.with_cache:
+        # measure the database and render path, not cache hits
+        class NullBackend(CacheBackend):
+            def get(self, key):
+                return None
+
+            def set(self, key, value, ttl):
+                pass
+
+            def delete(self, key):
+                pass
+
+        response_cache.backend = NullBackend()
+
+    client = app.test_client()
+    with app.app_context():
+        venue, artist = sample_ids(db, Venue, Artist)
+        counts = {
+            'venues': db.session.query(Venue).count(),
+            'artists': db.session.query(Artist).count(),
+            'shows': db.session.query(Show).count(),
+        }
+        db.session.remove()
+
+    routes = {}
+    for label, method, path, kwargs in build_requests(client, venue, artist, args.deep_pages):
+        if args.only and label not in args.only:
+            continue
+        routes[label] = measure(client, method, path, kwargs, args.iterations, args.warmup)
+        print(f'{label}: p50 {routes[label]["p50_ms"]} ms', file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].rsplit('@', 1)[-1],
+        'dataset': counts,
+        'cache': args.with_cache,
+        'routes': routes,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import random
+from datetime import timedelta
+from forms import genres_list, states_list
+from geocoding import geocode
+
+# ----------------------------------------------------------------------------#
+# Synthetic data generator.
+# ----------------------------------------------------------------------------#
+
+SCALES = {
+    '1k': 1000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+# rough population weights, so a few states hold most venues and artists like
+# in real listings; states not named here share the default weight.
+STATE_WEIGHTS = {
+    'CA': 39, 'TX': 29, 'FL': 22, 'NY': 20, 'PA': 13, 'IL': 13, 'OH': 12, 'GA': 11,
+    'NC': 10, 'MI': 10, 'NJ': 9, 'VA': 9, 'WA': 8, 'AZ': 7, 'MA': 7, 'TN': 7,
+}
+DEFAULT_STATE_WEIGHT = 2
+
+CITIES = {
+    'CA': ['Los Angeles', 'San Francisco', 'San Diego', 'Oakland', 'Sacramento'],
+    'TX': ['Austin', 'Houston', 'Dallas', 'San Antonio'],
+    'FL': ['Miami', 'Orlando', 'Tampa', 'Jacksonville'],
+    'NY': ['New York', 'Brooklyn', 'Buffalo', 'Rochester'],
+    'PA': ['Philadelphia', 'Pittsburgh'],
+    'IL': ['Chicago', 'Springfield'],
+    'OH': ['Columbus', 'Cleveland', 'Cincinnati'],
+    'GA': ['Atlanta', 'Savannah', 'Athens'],
+    'NC': ['Charlotte', 'Raleigh', 'Asheville'],
+    'MI': ['Detroit', 'Grand Rapids', 'Ann Arbor'],
+    'NJ': ['Newark', 'Jersey City'],
+    'VA': ['Richmond', 'Norfolk'],
+    'WA': ['Seattle', 'Spokane', 'Tacoma'],
+    'AZ': ['Phoenix', 'Tucson'],
+    'MA': ['Boston', 'Cambridge'],
+    'TN': ['Nashville', 'Memphis', 'Knoxville'],
+    'LA': ['New Orleans', 'Baton Rouge'],
+    'CO': ['Denver', 'Boulder'],
+    'OR': ['Portland', 'Eugene'],
+    'NV': ['Las Vegas', 'Reno'],
+}
+
+NAME_WORDS = ['Blue', 'Velvet', 'Golden', 'Electric', 'Silver', 'Midnight', 'Rusty', 'Neon', 'Wild',
+              'Crimson', 'Lucky', 'Hollow', 'Iron', 'Little', 'Grand', 'Secret', 'Red', 'Paper']
+VENUE_NOUNS = ['Room', 'Hall', 'Tavern', 'Lounge', 'Club', 'Theatre', 'Garden', 'Barn', 'Cellar', 'Stage']
+ARTIST_NOUNS = ['Owls', 'Rivers', 'Machines', 'Saints', 'Echoes', 'Foxes', 'Kings', 'Lights', 'Ghosts', 'Pilots']
+
+STATES = [state for state, _ in states_list]
+STATE_CUM_WEIGHTS = []
+for _state in STATES:
+    STATE_CUM_WEIGHTS.append((STATE_CUM_WEIGHTS[-1] if STATE_CUM_WEIGHTS else 0)
+                             + STATE_WEIGHTS.get(_state, DEFAULT_STATE_WEIGHT))
+GENRES = [genre for genre, _ in genres_list]
+# zipf-like popularity: the first genres in the list are the most common
+GENRE_WEIGHTS = [1.0 / rank for rank in range(1, len(GENRES) + 1)]
+
+
+def _place(rng):
+    state = rng.choices(STATES, cum_weights=STATE_CUM_WEIGHTS)[0]
+    cities = CITIES.get(state)
+    # bigger cities first in each list, so weight them higher
+    city = rng.choices(cities, weights=range(len(cities), 0, -1))[0] if cities else f'{state} City'
+    return city, state
+
+
+def _genres(rng):
+    return sorted(set(rng.choices(GENRES, weights=GENRE_WEIGHTS, k=rng.randint(1, 3))))
+
+
+def _phone(rng):
+    return ''.join(str(rng.randint(0, 9)) for _ in range(10))
+
+
+def venue_rows(rng, count):
+    for n in range(count):
+        city, state = _place(rng)
+        seeking_talent = rng.random() < 0.3
+        latitude, longitude = geocode(city, state)
+        yield {
+            'name': f'The {rng.choice(NAME_WORDS)} {rng.choice(VENUE_NOUNS)} {n}',
+            'city': city,
+            'state': state,
+            'address': f'{rng.randint(1, 9999)} Main Street',
+            'phone': _phone(rng),
+            'image_link': f'https://images.example.com/venues/{n}.jpg',
+            'facebook_link': f'https://www.facebook.com/venue{n}',
+            'website': f'https://venue{n}.example.com',
+            'genres': _genres(rng),
+            'seeking_talent': seeking_talent,
+            'seeking_description': 'Looking for local acts' if seeking_talent else None,
+            # jitter around the centroid so venues spread over the city
+            'latitude': latitude + rng.uniform(-0.1, 0.1),
+            'longitude': longitude + rng.uniform(-0.1, 0.1),
+        }
+
+
+def artist_rows(rng, count):
+    for n in range(count):
+        city, state = _place(rng)
+        seeking_venue = rng.random() < 0.4
+        yield {
+            'name': f'{rng.choice(NAME_WORDS)} {rng.choice(ARTIST_NOUNS)} {n}',
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'image_link': f'https://images.example.com/artists/{n}.jpg',
+            'facebook_link': f'https://www.facebook.com/artist{n}',
+            'website': f'https://artist{n}.example.com',
+            'genres': _genres(rng),
+            'seeking_venue': seeking_venue,
+            'seeking_description': 'Looking for gigs' if seeking_venue else None,
+        }
+
+
+def show_rows(rng, count, venue_ids, artist_ids, now):
+    # a year of history and a year of bookings, evenings only
+    for _ in range(count):
+        day = now + timedelta(days=rng.randint(-365, 365))
+        start_time = day.replace(hour=rng.randint(18, 23), minute=rng.choice((0, 30)), second=0, microsecond=0)
+        yield {
+            'venue_id': rng.choice(venue_ids),
+            'artist_id': rng.choice(artist_ids),
+            'start_time': start_time,
+            'counted_upcoming': start_time > now,
+        }
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(shows, venues=None, artists=None, batch_size=5000, random_seed=1, reset=False, report=print):
+    # a fixed random seed gives the same dataset every run, so results from
+    # different commits are comparable
+    from models import db, Venue, Artist, Show
+    from directory import venue_directory_refresher
+    import counters
+
+    rng = random.Random(random_seed)
+    venues = venues or max(shows // 20, 10)
+    artists = artists or max(shows // 10, 10)
+
+    if reset:
+        db.session.execute('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY')
+        db.session.commit()
+
+    ids = {}
+    for model, rows in ((Venue, venue_rows(rng, venues)), (Artist, artist_rows(rng, artists))):
+        table = model.__table__
+        ids[model] = []
+        for batch in _batched(rows, batch_size):
+            ids[model].extend(row[0] for row in db.session.execute(table.insert().values(batch).returning(table.c.id)))
+            db.session.commit()
+        report(f'{model.__tablename__}: {len(ids[model])} rows')
+
+    loaded = 0
+    rows = show_rows(rng, shows, ids[Venue], ids[Artist], counters.database_now(db.session.connection()))
+    for batch in _batched(rows, batch_size):
+        connection = db.session.connection()
+        connection.execute(Show.__table__.insert().values(batch))
+        counters.record_shows(connection, [
+            (row['venue_id'], row['artist_id'], row['counted_upcoming']) for row in batch])
+        db.session.commit()
+        loaded += len(batch)
+    report(f'Show: {loaded} rows')
+    db.session.execute('ANALYZE "Venue"; ANALYZE "Artist"; ANALYZE "Show"')
+    db.session.commit()
+    venue_directory_refresher.refresh()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic venues, artists and shows.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k', help='number of shows to generate')
+    parser.add_argument('--venues', type=int, help='venue count, shows / 20 by default')
+    parser.add_argument('--artists', type=int, help='artist count, shows / 10 by default')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help='truncate Venue, Artist and Show first')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        seed(SCALES[args.scale], args.venues, args.artists, args.batch_size, args.seed, args.reset)
+
+
+if __name__ == '__main__':
+    main()
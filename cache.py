@@ -0,0 +1,340 @@
+import hashlib
+import select
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request, session
+from sqlalchemy import event, text
+from werkzeug.http import is_resource_modified, quote_etag
+from werkzeug.utils import import_string
+from models import db, Venue, Artist, Show
+
+
+# ----------------------------------------------------------------------------#
+# Backends.
+# ----------------------------------------------------------------------------#
+
+class CacheBackend(object):
+    # interface for response cache stores. A shared store (redis, memcached)
+    # only needs to implement these three operations.
+    shared = True
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class LRUBackend(CacheBackend):
+    # in-process store bounded by entry count, with a per-entry expiry. Every
+    # process has its own, so invalidations are broadcast to the others (see
+    # ResponseCache).
+    shared = False
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# ----------------------------------------------------------------------------#
+# Response cache.
+# ----------------------------------------------------------------------------#
+
+NOTIFY_CHANNEL = 'response_cache'
+# pg_notify payloads are limited to 8000 bytes
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+def namespace(endpoint, **view_args):
+    # a namespace is one route with one set of view arguments, e.g.
+    # "show_venue:venue_id=3"; every query string variant of it (cursors) shares
+    # the namespace and is invalidated together.
+    args = ','.join(f'{name}={view_args[name]}' for name in sorted(view_args))
+    return f'{endpoint}:{args}'
+
+
+class ResponseCache(object):
+    # with a process-local backend, invalidations are published with
+    # pg_notify and every serving process LISTENs for them, so writes from
+    # another worker or a CLI command (imports, roll-over-shows) reach the
+    # pages cached in all of them.
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.reinvalidate_after = None
+        self._listener = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', None)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 300)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 2048)
+        app.config.setdefault('RESPONSE_CACHE_REINVALIDATE_AFTER', None)
+
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        if backend is None:
+            backend = LRUBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        elif isinstance(backend, str):
+            backend = import_string(backend)()
+        self.backend = backend
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.reinvalidate_after = app.config['RESPONSE_CACHE_REINVALIDATE_AFTER']
+        self.app = app
+
+        if not self.backend.shared:
+            app.before_request(self._start_listener)
+        event.listen(db.session, 'after_flush', _collect_invalidations)
+        event.listen(db.session, 'after_commit', self._apply_invalidations)
+        event.listen(db.session, 'after_rollback', _discard_invalidations)
+
+    def _version(self, ns):
+        # each namespace has a random version token that is part of every key in
+        # it. Invalidating deletes the token, so old entries are never hit again
+        # and simply age out of the backend, and a lost token can't resurrect them.
+        version_key = 'version:' + ns
+        version = self.backend.get(version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            self.backend.set(version_key, version, None)
+        return version
+
+    def listing_version(self, endpoint, **view_args):
+        # a conditional() version for pages whose every change goes through
+        # invalidate(): the namespace's version token, held in the backend, so
+        # a cache hit costs no database work
+        return (self._version(namespace(endpoint, **view_args)),)
+
+    def invalidate(self, *namespaces):
+        if not namespaces:
+            return
+        self._invalidate_locally(namespaces)
+        if not self.backend.shared:
+            try:
+                self._publish(namespaces)
+            except Exception:
+                # this runs after the commit, so a failed broadcast must not be
+                # reported as a failed write; other processes keep their pages
+                # until RESPONSE_CACHE_TTL
+                self.app.logger.exception('could not publish response cache invalidations')
+
+    def _invalidate_locally(self, namespaces):
+        self._drop_versions(namespaces)
+        if self.reinvalidate_after:
+            # a page re-rendered from a lagging read replica in the meantime still
+            # shows the old rows; drop it again once replicas have caught up
+            timer = threading.Timer(self.reinvalidate_after, self._drop_versions, (namespaces,))
+            timer.daemon = True
+            timer.start()
+
+    def _drop_versions(self, namespaces):
+        for ns in namespaces:
+            self.backend.delete('version:' + ns)
+
+    def _publish(self, namespaces):
+        # called after the commit, on its own autocommit connection
+        payloads = ['']
+        for ns in namespaces:
+            if payloads[-1] and len(payloads[-1]) + len(ns) + 1 > NOTIFY_PAYLOAD_LIMIT:
+                payloads.append('')
+            payloads[-1] += ('\n' if payloads[-1] else '') + ns
+        engine = db.get_engine(self.app)
+        with engine.connect() as connection:
+            connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+            for payload in payloads:
+                connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                                   channel=NOTIFY_CHANNEL, payload=payload)
+
+    def _start_listener(self):
+        # started from the first request so it runs in the serving process
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen_forever, daemon=True)
+            self._listener.start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                self.app.logger.exception('response cache invalidation listener failed, reconnecting')
+                # whatever was published while disconnected is lost, start over clean
+                self.backend = LRUBackend(self.app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+                time.sleep(1)
+
+    def _listen(self):
+        connection = db.get_engine(self.app).raw_connection()
+        try:
+            raw = connection.connection
+            raw.autocommit = True
+            raw.cursor().execute(f'LISTEN {NOTIFY_CHANNEL}')
+            while True:
+                if select.select([raw], [], [], 60) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    notification = raw.notifies.pop(0)
+                    self._invalidate_locally(notification.payload.split('\n'))
+        finally:
+            connection.invalidate()
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pages carrying flashed messages are personal, never cache them
+            if request.method != 'GET' or '_flashes' in session or g.get('skip_response_cache'):
+                return view(*args, **kwargs)
+
+            ns = namespace(request.endpoint, **(request.view_args or {}))
+            # under @conditional the page's data version is part of the key, so a
+            # body cached before a change the version saw (a show passing, a write
+            # from another process) is never sent under the new ETag
+            key = (f'page:{ns}:{self._version(ns)}:{g.get("page_etag", "")}:'
+                   f'{request.query_string.decode("latin-1")}')
+            hit = self.backend.get(key)
+            if hit is not None:
+                body, mimetype = hit
+                return current_app.response_class(body, mimetype=mimetype)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                self.backend.set(key, (response.get_data(), response.mimetype), self.ttl)
+            return response
+        return wrapper
+
+    def memoize(self, ns, name, compute):
+        # a value derived from the same data as the pages of a namespace (the
+        # genre counts of a listing), kept under its version token so it is
+        # dropped together with them; every page variant reuses it
+        key = f'value:{ns}:{self._version(ns)}:{name}'
+        value = self.backend.get(key)
+        if value is None:
+            value = compute()
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def _apply_invalidations(self, db_session):
+        namespaces = db_session.info.pop('cache_invalidations', None)
+        if namespaces:
+            self.invalidate(*namespaces)
+
+
+def _collect_invalidations(db_session, flush_context):
+    # work out which cached pages a flush affects while the changed objects are
+    # still known; they are only dropped once the transaction commits.
+    namespaces = db_session.info.setdefault('cache_invalidations', set())
+    changed = list(db_session.new) + list(db_session.deleted) + [
+        obj for obj in db_session.dirty if db_session.is_modified(obj)
+    ]
+    connection = db_session.connection()
+    show_table = Show.__table__
+
+    for obj in changed:
+        if isinstance(obj, Show):
+            namespaces.update((
+                namespace('shows'),
+                namespace('show_calendar'),
+                namespace('venues'),
+                namespace('show_venue', venue_id=obj.venue_id),
+                namespace('show_artist', artist_id=obj.artist_id),
+            ))
+        elif isinstance(obj, Venue):
+            namespaces.update((namespace('venues'), namespace('show_venue', venue_id=obj.id)))
+            if obj in db_session.dirty:
+                # venue name and image appear on the shows page and artist pages
+                namespaces.add(namespace('shows'))
+                artist_ids = connection.execute(
+                    show_table.select().with_only_columns([show_table.c.artist_id]).where(
+                        show_table.c.venue_id == obj.id).distinct()
+                )
+                namespaces.update(namespace('show_artist', artist_id=row[0]) for row in artist_ids)
+        elif isinstance(obj, Artist):
+            namespaces.update((namespace('artists'), namespace('show_artist', artist_id=obj.id)))
+            if obj in db_session.dirty:
+                # artist name and image appear on the shows page and venue pages
+                namespaces.add(namespace('shows'))
+                venue_ids = connection.execute(
+                    show_table.select().with_only_columns([show_table.c.venue_id]).where(
+                        show_table.c.artist_id == obj.id).distinct()
+                )
+                namespaces.update(namespace('show_venue', venue_id=row[0]) for row in venue_ids)
+
+
+def _discard_invalidations(db_session):
+    db_session.info.pop('cache_invalidations', None)
+
+
+response_cache = ResponseCache()
+
+
+# ----------------------------------------------------------------------------#
+# Conditional GET.
+# ----------------------------------------------------------------------------#
+
+def conditional(version):
+    # answers 304 Not Modified before the view runs when the client already has
+    # the current page. version(**view_args) returns a tuple that changes with
+    # everything the page shows, or None to render normally; it is hashed into a
+    # weak ETag, which @response_cache.cached below also keys on. There is no
+    # Last-Modified: a version can change (a show passing, a show deleted)
+    # without any timestamp moving, so If-Modified-Since alone would get a
+    # stale 304.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+                return view(*args, **kwargs)
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+
+            etag = hashlib.sha1(repr(current).encode()).hexdigest()
+            g.page_etag = etag
+            if is_resource_modified(request.environ, quote_etag(etag, weak=True)):
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            # always revalidate rather than reuse on heuristic freshness
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,200 @@
+import sys
+import time
+import click
+from sqlalchemy import inspect, bindparam, text
+from models import db, Venue, Artist, Show
+from cache import response_cache, namespace
+import counters
+from importer import Importer
+import exporter
+from directory import venue_directory_refresher
+from geocoding import geocode
+from assets import AssetBuilder
+from replicas import replica_router
+
+
+# ----------------------------------------------------------------------------#
+# CLI commands.
+# ----------------------------------------------------------------------------#
+
+def missing_fk_indexes():
+    # every foreign key column of the ORM's tables should lead some index in the
+    # live database, otherwise joins and per-parent filters on it scan the table.
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        leading = set()
+        for index in inspector.get_indexes(table.name):
+            if index['column_names']:
+                leading.add(index['column_names'][0])
+        primary_key = inspector.get_pk_constraint(table.name)['constrained_columns']
+        if primary_key:
+            leading.add(primary_key[0])
+        for fk in table.foreign_keys:
+            if fk.parent.name not in leading:
+                missing.append((table.name, fk.parent.name, fk.target_fullname))
+    return missing
+
+
+def missing_declared_indexes():
+    # indexes declared on the models but not present in the database, i.e. a
+    # migration that has not been applied yet.
+    # Read from pg_indexes, since the inspector skips expression indexes such
+    # as ix_venue_earth_location.
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    existing = set(db.session.execute(text(
+        'SELECT tablename, indexname FROM pg_indexes WHERE schemaname = current_schema()')).fetchall())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for index in table.indexes:
+            if (table.name, index.name) not in existing:
+                missing.append((table.name, index.name))
+    return missing
+
+
+def init_app(app):
+
+    @app.cli.command('check-indexes')
+    def check_indexes():
+        """Report foreign keys and declared indexes missing from the database."""
+        fk_missing = missing_fk_indexes()
+        declared_missing = missing_declared_indexes()
+
+        for table, column, target in fk_missing:
+            click.echo(f'missing index: {table}.{column} (foreign key to {target})')
+        for table, name in declared_missing:
+            click.echo(f'missing index: {name} on {table} (declared on the model, run "flask db upgrade")')
+
+        if fk_missing or declared_missing:
+            sys.exit(1)
+        click.echo('All foreign keys and declared indexes are covered.')
+
+    @app.cli.command('roll-over-shows')
+    def roll_over_shows():
+        """Move shows that have started from the upcoming to the past counters."""
+        moved = counters.roll_over(db.session.connection())
+        db.session.commit()
+
+        namespaces = {namespace('venues'), namespace('artists')}
+        for venue_id, artist_id in moved:
+            namespaces.add(namespace('show_venue', venue_id=venue_id))
+            namespaces.add(namespace('show_artist', artist_id=artist_id))
+        response_cache.invalidate(*namespaces)
+        click.echo(f'Rolled over {len(moved)} shows.')
+
+    @app.cli.command('verify-show-counts')
+    @click.option('--fix', is_flag=True, help='Overwrite drifted counters with the recomputed values.')
+    def verify_show_counts(fix):
+        """Recompute the show counters on Venue and Artist and report drift."""
+        drifted = 0
+        for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+            rows = counters.count_drift(model, show_fk)
+            drifted += len(rows)
+            for entity_id, stored_upcoming, upcoming, stored_past, past in rows:
+                click.echo(f'{model.__tablename__} {entity_id}: upcoming {stored_upcoming} != {upcoming}, '
+                           f'past {stored_past} != {past}')
+            if fix and rows:
+                counters.adjust(db.session.connection(), model, {
+                    entity_id: (upcoming - stored_upcoming, past - stored_past)
+                    for entity_id, stored_upcoming, upcoming, stored_past, past in rows
+                })
+
+        if fix and drifted:
+            db.session.commit()
+            click.echo(f'Fixed {drifted} drifted counters.')
+        elif drifted:
+            sys.exit(1)
+        else:
+            click.echo('All show counters match.')
+
+    @app.cli.command('import')
+    @click.option('--venues', type=click.Path(exists=True, dir_okay=False), help='Venues .csv or .jsonl file.')
+    @click.option('--artists', type=click.Path(exists=True, dir_okay=False), help='Artists .csv or .jsonl file.')
+    @click.option('--shows', type=click.Path(exists=True, dir_okay=False), help='Shows .csv or .jsonl file.')
+    @click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT statement and commit.')
+    def import_data(venues, artists, shows, batch_size):
+        """Bulk load venues, artists and shows from CSV or JSONL files."""
+        importer = Importer(batch_size=batch_size, report=click.echo)
+        rejected = 0
+        # venues and artists first so that shows can reference them
+        for path, load in ((venues, importer.import_venues), (artists, importer.import_artists),
+                           (shows, importer.import_shows)):
+            if path:
+                rejected += load(path)[1]
+        if venues or shows:
+            venue_directory_refresher.refresh()
+        if rejected:
+            sys.exit(1)
+
+    @app.cli.command('export')
+    @click.argument('model_name', type=click.Choice(sorted(exporter.EXPORTS)))
+    @click.option('--format', 'format', type=click.Choice(sorted(exporter.FORMATS)), default='csv', show_default=True)
+    @click.option('--updated-since', type=click.DateTime(), help='Only rows changed at or after this time.')
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Output file, stdout by default.')
+    def export_data(model_name, format, updated_since, output):
+        """Stream venues, artists or shows as CSV or JSONL."""
+        for chunk in exporter.export(model_name, format, updated_since):
+            output.write(chunk)
+
+    @app.cli.command('refresh-venue-directory')
+    def refresh_venue_directory():
+        """Refresh the venue_directory materialized view, e.g. from cron."""
+        started = time.monotonic()
+        venue_directory_refresher.refresh()
+        click.echo(f'Refreshed venue_directory in {time.monotonic() - started:.2f}s.')
+
+    @app.cli.command('replica-status')
+    def replica_status():
+        """Check every read replica's health and replication lag."""
+        if not replica_router.replicas:
+            click.echo('No read replicas configured (DATABASE_REPLICA_URLS).')
+            return
+        replica_router.check()
+        for replica in replica_router.replicas:
+            state = 'healthy' if replica.healthy else 'evicted'
+            detail = replica.error or f'lag {replica.lag:.1f}s'
+            click.echo(f'{replica.name}: {state}, {detail}')
+        if not all(replica.healthy for replica in replica_router.replicas):
+            sys.exit(1)
+
+    @app.cli.command('build-assets')
+    def build_assets():
+        """Bundle, fingerprint and precompress static assets for /assets/."""
+        manifest = AssetBuilder(app.static_folder, app.config['ASSETS_FOLDER'], report=click.echo).build()
+        click.echo(f'Wrote {len(manifest)} assets to {app.config["ASSETS_FOLDER"]}; restart the app to load the manifest.')
+
+    @app.cli.command('geocode-venues')
+    @click.option('--all', 'everything', is_flag=True, help='Re-geocode venues that already have coordinates.')
+    def geocode_venues(everything):
+        """Fill Venue latitude/longitude from the bundled gazetteer."""
+        query = db.session.query(Venue.city, Venue.state).distinct()
+        if not everything:
+            query = query.filter(Venue.latitude.is_(None))
+
+        # one UPDATE per distinct city/state rather than per venue
+        table = Venue.__table__
+        statement = table.update().where(
+            table.c.city == bindparam('b_city')
+        ).where(
+            table.c.state == bindparam('b_state')
+        ).values(latitude=bindparam('b_latitude'), longitude=bindparam('b_longitude'))
+        if not everything:
+            statement = statement.where(table.c.latitude.is_(None))
+
+        params, unknown = [], 0
+        for city, state in query.all():
+            latitude, longitude = geocode(city, state)
+            if latitude is None:
+                unknown += 1
+                continue
+            params.append({'b_city': city, 'b_state': state, 'b_latitude': latitude, 'b_longitude': longitude})
+        if params:
+            db.session.execute(statement, params)
+        db.session.commit()
+        click.echo(f'Geocoded {len(params)} city/state pairs, {unknown} not found in the gazetteer.')
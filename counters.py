@@ -0,0 +1,111 @@
+from collections import Counter
+from sqlalchemy import event, func, bindparam, select
+from models import db, Venue, Artist, Show
+
+
+# ----------------------------------------------------------------------------#
+# Show counters.
+# ----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_shows_count/past_shows_count. Each Show
+# remembers which bucket it is counted in (Show.counted_upcoming), so inserts and
+# deletes adjust exactly that bucket and roll_over() moves shows whose start_time
+# has passed from upcoming to past. Every upcoming/past decision uses the
+# database clock, so the app and database time zones can't disagree about it.
+
+def database_now(connection):
+    # the database's current time in the naive local form Show.start_time is stored in
+    return connection.scalar(select([func.localtimestamp()]))
+
+
+def _adjust_statement(model):
+    table = model.__table__
+    return table.update().where(
+        table.c.id == bindparam('entity_id')
+    ).values(
+        upcoming_shows_count=table.c.upcoming_shows_count + bindparam('upcoming_delta'),
+        past_shows_count=table.c.past_shows_count + bindparam('past_delta'),
+    )
+
+
+def adjust(connection, model, deltas):
+    # deltas: {entity_id: (upcoming_delta, past_delta)}, applied as one executemany
+    params = [{
+        'entity_id': entity_id, 'upcoming_delta': upcoming, 'past_delta': past
+    } for entity_id, (upcoming, past) in deltas.items() if upcoming or past]
+    if params:
+        connection.execute(_adjust_statement(model), params)
+
+
+def record_shows(connection, shows, sign=1):
+    # shows: iterable of (venue_id, artist_id, counted_upcoming); sign=-1 removes
+    venue_deltas = Counter()
+    artist_deltas = Counter()
+    for venue_id, artist_id, counted_upcoming in shows:
+        bucket = 'upcoming' if counted_upcoming else 'past'
+        venue_deltas[venue_id, bucket] += sign
+        artist_deltas[artist_id, bucket] += sign
+
+    for model, deltas in ((Venue, venue_deltas), (Artist, artist_deltas)):
+        adjust(connection, model, {
+            entity_id: (deltas[entity_id, 'upcoming'], deltas[entity_id, 'past'])
+            for entity_id, _ in deltas
+        })
+
+
+@event.listens_for(Show, 'before_insert')
+def _assign_bucket(mapper, connection, target):
+    target.counted_upcoming = target.start_time > database_now(connection)
+
+
+@event.listens_for(Show, 'after_insert')
+def _count_inserted(mapper, connection, target):
+    record_shows(connection, [(target.venue_id, target.artist_id, target.counted_upcoming)])
+
+
+@event.listens_for(Show, 'after_delete')
+def _count_deleted(mapper, connection, target):
+    record_shows(connection, [(target.venue_id, target.artist_id, target.counted_upcoming)], sign=-1)
+
+
+def roll_over(connection):
+    # move every show that has started since the last run from the upcoming to
+    # the past bucket; returns the affected (venue_id, artist_id) pairs.
+    show_table = Show.__table__
+    moved = connection.execute(
+        show_table.update().where(
+            show_table.c.counted_upcoming
+        ).where(
+            show_table.c.start_time <= func.now()
+        ).values(
+            counted_upcoming=False
+        ).returning(show_table.c.venue_id, show_table.c.artist_id)
+    ).fetchall()
+
+    venue_moves = Counter(venue_id for venue_id, _ in moved)
+    artist_moves = Counter(artist_id for _, artist_id in moved)
+    adjust(connection, Venue, {entity_id: (-n, n) for entity_id, n in venue_moves.items()})
+    adjust(connection, Artist, {entity_id: (-n, n) for entity_id, n in artist_moves.items()})
+    return moved
+
+
+def count_drift(model, show_fk):
+    # recompute the counters from the per-show buckets and return the rows whose
+    # stored values disagree: (id, stored_upcoming, actual_upcoming, stored_past, actual_past).
+    # Shows that started since the last roll_over() are still counted upcoming,
+    # so they are not drift.
+    actual = db.session.query(
+        show_fk.label('entity_id'),
+        func.count(Show.id).filter(Show.counted_upcoming).label('upcoming'),
+        func.count(Show.id).filter(~Show.counted_upcoming).label('past'),
+    ).group_by(show_fk).subquery()
+
+    upcoming = func.coalesce(actual.c.upcoming, 0)
+    past = func.coalesce(actual.c.past, 0)
+    return db.session.query(
+        model.id, model.upcoming_shows_count, upcoming, model.past_shows_count, past
+    ).outerjoin(
+        actual, actual.c.entity_id == model.id
+    ).filter(
+        (model.upcoming_shows_count != upcoming) | (model.past_shows_count != past)
+    ).order_by(model.id).all()
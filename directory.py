@@ -0,0 +1,91 @@
+import threading
+import time
+from sqlalchemy import event, text
+from models import db, Venue, Show
+from cache import response_cache, namespace
+
+
+# ----------------------------------------------------------------------------#
+# Venue directory refresh.
+# ----------------------------------------------------------------------------#
+
+class VenueDirectory(object):
+    # keeps the venue_directory materialized view fresh. Commits that touch
+    # Venue or Show mark it dirty, and it is also considered stale after
+    # VENUE_DIRECTORY_MAX_AGE seconds. In 'stale-while-refresh' mode readers
+    # get the current contents while a background thread refreshes the view;
+    # in 'sync' mode the reader that finds it stale refreshes it first.
+
+    def __init__(self, app=None):
+        self._dirty = True
+        self._refreshed_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('VENUE_DIRECTORY_MODE', 'stale-while-refresh')
+        app.config.setdefault('VENUE_DIRECTORY_MAX_AGE', 300)
+        self.app = app
+        self.mode = app.config['VENUE_DIRECTORY_MODE']
+        self.max_age = app.config['VENUE_DIRECTORY_MAX_AGE']
+
+        event.listen(db.session, 'after_flush', _collect_directory_changes)
+        event.listen(db.session, 'after_commit', self._after_commit)
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def _after_commit(self, db_session):
+        if db_session.info.pop('venue_directory_dirty', False):
+            self.mark_dirty()
+
+    def is_stale(self):
+        if self._dirty or self._refreshed_at is None:
+            return True
+        return time.monotonic() - self._refreshed_at > self.max_age
+
+    def refresh(self):
+        # CONCURRENTLY keeps the view readable while it is rebuilt; it cannot
+        # run inside a transaction block, hence the autocommit connection.
+        self._dirty = False
+        engine = db.get_engine(self.app)
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').execute(
+                text('REFRESH MATERIALIZED VIEW CONCURRENTLY venue_directory'))
+        self._refreshed_at = time.monotonic()
+        # pages rendered from the old contents are now outdated
+        response_cache.invalidate(namespace('venues'))
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            self._dirty = True
+            self.app.logger.exception('venue directory refresh failed')
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def ensure_fresh(self):
+        if not self.is_stale():
+            return
+        if self.mode == 'sync':
+            self.refresh()
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+
+def _collect_directory_changes(db_session, flush_context):
+    for obj in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+        if isinstance(obj, (Venue, Show)):
+            db_session.info['venue_directory_dirty'] = True
+            return
+
+
+venue_directory_refresher = VenueDirectory()
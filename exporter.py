@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from datetime import datetime
+from models import db, Venue, Artist, Show
+
+
+# ----------------------------------------------------------------------------#
+# Streaming export.
+# ----------------------------------------------------------------------------#
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def _venue_query():
+    return db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone, Venue.genres,
+        Venue.image_link, Venue.facebook_link, Venue.website, Venue.seeking_talent,
+        Venue.seeking_description, Venue.upcoming_shows_count, Venue.past_shows_count, Venue.updated_at
+    ), Venue
+
+
+def _artist_query():
+    return db.session.query(
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone, Artist.genres,
+        Artist.image_link, Artist.facebook_link, Artist.website, Artist.seeking_venue,
+        Artist.seeking_description, Artist.upcoming_shows_count, Artist.past_shows_count, Artist.updated_at
+    ), Artist
+
+
+def _show_query():
+    # names come from joins in the same statement, not the show.venue/show.artist backrefs
+    return db.session.query(
+        Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+        Show.artist_id, Artist.name.label('artist_name'), Show.updated_at
+    ).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ), Show
+
+
+EXPORTS = {
+    'venues': _venue_query,
+    'artists': _artist_query,
+    'shows': _show_query,
+}
+
+
+def export_rows(model_name, updated_since=None, batch_size=1000):
+    # (field names, row iterator) for one model, read through a server-side
+    # cursor in primary key order; updated_since restricts it to changed rows.
+    query, model = EXPORTS[model_name]()
+    if updated_since is not None:
+        query = query.filter(model.updated_at >= updated_since)
+    query = query.order_by(model.id).yield_per(batch_size)
+    fields = [column['name'] for column in query.column_descriptions]
+    return fields, iter(query)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        # the same list separator the importer reads
+        return ';'.join(value)
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(fields, rows, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(fields, rows, rows_per_chunk=500):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({field: _json_value(value) for field, value in zip(fields, row)}))
+        if len(lines) == rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export(model_name, format, updated_since=None, batch_size=1000):
+    # text chunks of the export, generated incrementally
+    fields, rows = export_rows(model_name, updated_since, batch_size)
+    writer = iter_csv if format == 'csv' else iter_jsonl
+    return writer(fields, rows)
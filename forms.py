@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import datetime, time
+from dateutil.relativedelta import relativedelta
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Regexp
+from wtforms import (StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField,
+                     DateField, TextAreaField)
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Regexp, Optional, NumberRange
 import re
 
 
@@ -95,6 +97,122 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
+
+recurrences = {
+    'daily': relativedelta(days=1),
+    'weekly': relativedelta(weeks=1),
+    'biweekly': relativedelta(weeks=2),
+    'monthly': relativedelta(months=1),
+}
+
+schedule_time_formats = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+
+class BatchShowForm(ShowForm):
+    # many shows in one submission: start_time repeated by a recurrence rule
+    # (a weekly residency), and/or a schedule with one show per line, either
+    # "start_time" for the artist and venue above or
+    # "artist_id, venue_id, start_time".
+    start_time = DateTimeField(
+        'start_time',
+        validators=[Optional()]
+    )
+    repeat = SelectField(
+        'repeat',
+        choices=[('', 'Does not repeat'), ('daily', 'Daily'), ('weekly', 'Weekly'),
+                 ('biweekly', 'Every two weeks'), ('monthly', 'Monthly')],
+        default=''
+    )
+    occurrences = IntegerField(
+        'occurrences', validators=[Optional(), NumberRange(min=1)]
+    )
+    until = DateField(
+        'until', validators=[Optional()]
+    )
+    schedule = TextAreaField(
+        'schedule'
+    )
+
+    def validate(self):
+        if not super(BatchShowForm, self).validate():
+            return False
+        if not self.start_time.data and not (self.schedule.data or '').strip():
+            self.start_time.errors.append('A start time or a schedule is required.')
+            return False
+        if self.repeat.data and not self.start_time.data:
+            self.repeat.errors.append('A repeating show needs a start time.')
+            return False
+        if self.repeat.data and not (self.occurrences.data or self.until.data):
+            self.repeat.errors.append('Give the number of occurrences or an end date.')
+            return False
+        return True
+
+    def _recurring_times(self, max_rows):
+        start = self.start_time.data
+        if not start:
+            return []
+        if not self.repeat.data:
+            return [start]
+        step = recurrences[self.repeat.data]
+        until = datetime.combine(self.until.data, time.max) if self.until.data else None
+        # one past the limit, so rows() reports the overflow instead of the
+        # residency silently ending early
+        count = min(self.occurrences.data or max_rows + 1, max_rows + 1)
+        times = []
+        for number in range(count):
+            start_time = start + step * number
+            if until and start_time > until:
+                break
+            times.append(start_time)
+        return times
+
+    def rows(self, max_rows):
+        # one dict per show to create, each labelled for error reporting; rows that
+        # could not be parsed carry an 'error' instead of ids and a start time.
+        # Ids are left unchecked, references are verified for the whole batch at once.
+        rows = []
+        for start_time in self._recurring_times(max_rows):
+            rows.append({'label': start_time.strftime('%Y-%m-%d %H:%M'), 'artist_id': self.artist_id.data,
+                         'venue_id': self.venue_id.data, 'start_time': start_time})
+
+        for line_number, line in enumerate((self.schedule.data or '').splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            row = {'label': f'line {line_number}: {line}'}
+            parts = [part.strip() for part in line.split(',')]
+            if len(parts) == 1:
+                row['artist_id'], row['venue_id'] = self.artist_id.data, self.venue_id.data
+            elif len(parts) == 3:
+                row['artist_id'], row['venue_id'] = parts[0], parts[1]
+            else:
+                row['error'] = 'expected "start_time" or "artist_id, venue_id, start_time"'
+                rows.append(row)
+                continue
+            for time_format in schedule_time_formats:
+                try:
+                    row['start_time'] = datetime.strptime(parts[-1], time_format)
+                    break
+                except ValueError:
+                    pass
+            else:
+                row['error'] = 'start time must look like YYYY-MM-DD HH:MM'
+            rows.append(row)
+
+        for row in rows:
+            if 'error' in row:
+                continue
+            try:
+                row['artist_id'] = int(row['artist_id'])
+                row['venue_id'] = int(row['venue_id'])
+            except (TypeError, ValueError):
+                row['error'] = 'artist_id and venue_id must be integers'
+        if len(rows) > max_rows:
+            rows[max_rows:] = [{'label': f'shows after {rows[max_rows - 1]["label"]}',
+                                'error': f'at most {max_rows} shows per batch, the rest were not created'}]
+        return rows
+
+
 class VenueForm(Form):
     name = StringField(
         'name', validators=[DataRequired()]
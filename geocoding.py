@@ -0,0 +1,44 @@
+import csv
+import os
+from functools import lru_cache
+from sqlalchemy import event, inspect
+from models import Venue
+
+
+# ----------------------------------------------------------------------------#
+# Offline geocoding.
+# ----------------------------------------------------------------------------#
+
+# bundled gazetteer of city centroids; rows with an empty city are the state
+# centroid, used when a venue's city is not listed.
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    places = {}
+    with open(GAZETTEER_PATH, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            places[row['state'], row['city'].strip().lower()] = (float(row['latitude']), float(row['longitude']))
+    return places
+
+
+def geocode(city, state):
+    # (latitude, longitude) of the city, else of the state, else (None, None)
+    places = gazetteer()
+    return places.get((state, (city or '').strip().lower())) or places.get((state, ''), (None, None))
+
+
+@event.listens_for(Venue, 'before_insert')
+def _geocode_new_venue(mapper, connection, target):
+    if target.latitude is None or target.longitude is None:
+        target.latitude, target.longitude = geocode(target.city, target.state)
+
+
+@event.listens_for(Venue, 'before_update')
+def _geocode_moved_venue(mapper, connection, target):
+    # re-geocode when the city or state changes, unless coordinates were set explicitly
+    attrs = inspect(target).attrs
+    moved = attrs.city.history.has_changes() or attrs.state.history.has_changes()
+    if moved and not (attrs.latitude.history.has_changes() or attrs.longitude.history.has_changes()):
+        target.latitude, target.longitude = geocode(target.city, target.state)
@@ -0,0 +1,224 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+from wtforms import BooleanField
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+from cache import response_cache, namespace
+import counters
+import queries
+from geocoding import geocode
+
+
+# ----------------------------------------------------------------------------#
+# Bulk import.
+# ----------------------------------------------------------------------------#
+
+# fields copied from a validated form into the table row, per model
+VENUE_FIELDS = ('name', 'city', 'state', 'address', 'phone', 'image_link', 'genres',
+                'facebook_link', 'website', 'seeking_talent', 'seeking_description')
+ARTIST_FIELDS = ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+                 'facebook_link', 'website', 'seeking_venue', 'seeking_description')
+LIST_FIELDS = ('genres',)
+FALSE_VALUES = ('', '0', 'false', 'no', 'n', 'off')
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path):
+    # stream dict rows from a .csv or .jsonl file together with their line number;
+    # list fields in CSV files are separated by ';'.
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+    elif path.endswith('.csv'):
+        with open(path, encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                for field in LIST_FIELDS:
+                    if field in row:
+                        row[field] = [value.strip() for value in row[field].split(';') if value.strip()]
+                yield reader.line_num, row
+    else:
+        raise ValueError(f'{path}: expected a .csv or .jsonl file')
+
+
+def _formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(key, item)
+        elif isinstance(value, bool):
+            formdata.add(key, 'y' if value else '')
+        elif value is not None:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def _truthy(value):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    return str(value).strip().lower() not in FALSE_VALUES
+
+
+class RowValidator(object):
+    # validates rows with the same WTForms classes the create routes use; one
+    # form instance is reprocessed per row instead of building a form per row.
+
+    def __init__(self, form_class, fields):
+        self.form = form_class(formdata=None, csrf_enabled=False)
+        self.fields = fields
+
+    def __call__(self, row):
+        form = self.form
+        form.process(_formdata(row))
+        if not form.validate():
+            raise RowError('; '.join(f'{field} {"|".join(errors)}' for field, errors in form.errors.items()))
+        values = {field: form[field].data for field in self.fields}
+        for field in self.fields:
+            if isinstance(form[field], BooleanField):
+                # files spell booleans many ways, the form only knows 'false' and ''
+                values[field] = _truthy(row.get(field))
+        return values
+
+
+def _show_validator():
+    form_validator = RowValidator(ShowForm, ('artist_id', 'venue_id', 'start_time'))
+
+    def validate(row):
+        # the form would silently fall back to its default start time
+        if not row.get('start_time'):
+            raise RowError('start_time is required')
+        try:
+            # the exporter writes ISO 8601 ("2021-05-01T20:00:00"), which the
+            # form's DateTimeField (%Y-%m-%d %H:%M:%S) doesn't read; accept it
+            # so an export re-imports
+            start_time = datetime.fromisoformat(str(row['start_time']).strip())
+        except ValueError:
+            pass
+        else:
+            row = dict(row, start_time=start_time.strftime('%Y-%m-%d %H:%M:%S'))
+        values = form_validator(row)
+        try:
+            values['artist_id'] = int(values['artist_id'])
+            values['venue_id'] = int(values['venue_id'])
+        except (TypeError, ValueError):
+            raise RowError('artist_id and venue_id must be integers')
+        return values
+    return validate
+
+
+class Importer(object):
+
+    def __init__(self, batch_size=5000, report=print):
+        self.batch_size = batch_size
+        self.report = report
+
+    def _batches(self, path, validate):
+        # validated rows in batches of batch_size; invalid rows are reported and skipped
+        batch = []
+        for line_number, row in read_rows(path):
+            try:
+                batch.append(validate(row))
+            except RowError as e:
+                self.rejected += 1
+                self.report(f'{os.path.basename(path)}:{line_number}: {e}')
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _progress(self, label, started):
+        elapsed = time.monotonic() - started
+        rate = self.loaded / elapsed if elapsed else 0
+        self.report(f'{label}: {self.loaded} loaded, {self.rejected} rejected, {rate:,.0f} rows/s')
+
+    def import_entities(self, path, model, validate, listing_endpoint, detail_endpoint, id_arg):
+        self.loaded = self.rejected = 0
+        started = time.monotonic()
+        table = model.__table__
+        for batch in self._batches(path, validate):
+            # one multi-row INSERT per batch
+            ids = [row[0] for row in db.session.execute(table.insert().values(batch).returning(table.c.id))]
+            db.session.commit()
+            response_cache.invalidate(namespace(listing_endpoint),
+                                      *(namespace(detail_endpoint, **{id_arg: entity_id}) for entity_id in ids))
+            self.loaded += len(ids)
+            self._progress(model.__tablename__, started)
+        return self.loaded, self.rejected
+
+    def import_venues(self, path):
+        form_validator = RowValidator(VenueForm, VENUE_FIELDS)
+
+        def validate(row):
+            # multi-row INSERTs bypass the ORM geocoding hook
+            values = form_validator(row)
+            values['latitude'], values['longitude'] = geocode(values['city'], values['state'])
+            return values
+        return self.import_entities(path, Venue, validate, 'venues', 'show_venue', 'venue_id')
+
+    def import_artists(self, path):
+        return self.import_entities(path, Artist, RowValidator(ArtistForm, ARTIST_FIELDS),
+                                     'artists', 'show_artist', 'artist_id')
+
+    def import_shows(self, path):
+        self.loaded = self.rejected = 0
+        started = time.monotonic()
+        for batch in self._batches(path, _show_validator()):
+            inserted, rejected = insert_shows(batch)
+            for row, error in rejected:
+                self.rejected += 1
+                self.report(f'{os.path.basename(path)}: show {row["artist_id"]}@{row["venue_id"]}: {error}')
+            self.loaded += len(inserted)
+            if inserted:
+                self._progress('Show', started)
+        return self.loaded, self.rejected
+
+
+def insert_shows(rows):
+    # rows: dicts with artist_id, venue_id and start_time. The artist/venue
+    # references of all rows are resolved in one query, and the rows that pass
+    # are inserted with one multi-row INSERT and committed together. Returns
+    # (inserted rows, [(rejected row, reason)]).
+    venue_ids, artist_ids = queries.existing_show_references(
+        {row['venue_id'] for row in rows}, {row['artist_id'] for row in rows})
+    inserted = []
+    rejected = []
+    for row in rows:
+        if row['venue_id'] not in venue_ids:
+            rejected.append((row, f'unknown venue {row["venue_id"]}'))
+        elif row['artist_id'] not in artist_ids:
+            rejected.append((row, f'unknown artist {row["artist_id"]}'))
+        else:
+            inserted.append(row)
+    if not inserted:
+        return inserted, rejected
+
+    # multi-row INSERTs bypass the ORM events, so buckets and counters are set here
+    connection = db.session.connection()
+    now = counters.database_now(connection)
+    values = [{
+        'artist_id': row['artist_id'],
+        'venue_id': row['venue_id'],
+        'start_time': row['start_time'],
+        'counted_upcoming': row['start_time'] > now,
+    } for row in inserted]
+    connection.execute(Show.__table__.insert().values(values))
+    counters.record_shows(connection, [
+        (row['venue_id'], row['artist_id'], row['counted_upcoming']) for row in values])
+    db.session.commit()
+
+    response_cache.invalidate(
+        namespace('shows'), namespace('show_calendar'), namespace('venues'),
+        *{namespace('show_venue', venue_id=row['venue_id']) for row in inserted},
+        *{namespace('show_artist', artist_id=row['artist_id']) for row in inserted})
+    return inserted, rejected
@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from flask import current_app as app, g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+
+# ----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+# ----------------------------------------------------------------------------#
+
+class QueryStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        # statement text with parameters stripped out, so the same query shape
+        # issued once per row (N+1) shows up as a repeated key
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total += duration
+        self.shapes[statement] += 1
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+    def repeated(self, threshold):
+        return [(statement, count) for statement, count in self.shapes.most_common() if count >= threshold]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if has_request_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _shorten(statement, length=200):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + '...'
+
+
+class QueryInstrumentation(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_QUERY_BUDGET', 20)
+        app.config.setdefault('SQL_TIME_BUDGET_MS', 200)
+        app.config.setdefault('SQL_REPEAT_THRESHOLD', 5)
+
+        instrument_engine(db.get_engine(app))
+        app.before_request(self._start)
+        app.after_request(self._report)
+
+    def _start(self):
+        g.query_stats = QueryStats()
+
+    def _report(self, response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = stats.total * 1000
+        slowest_ms = stats.slowest * 1000
+        response.headers.add('Server-Timing', f'db;dur={total_ms:.2f};desc="{stats.count} queries"')
+        if stats.count:
+            response.headers.add('Server-Timing', f'db-slowest;dur={slowest_ms:.2f}')
+
+        repeated = stats.repeated(app.config['SQL_REPEAT_THRESHOLD'])
+        for statement, count in repeated:
+            app.logger.warning('N+1 suspected on %s %s: %d x %s',
+                               request.method, request.path, count, _shorten(statement))
+        if stats.count > app.config['SQL_QUERY_BUDGET'] or total_ms > app.config['SQL_TIME_BUDGET_MS']:
+            app.logger.warning('SQL budget exceeded on %s %s: %d queries, %.1f ms total, slowest %.1f ms: %s',
+                               request.method, request.path, stats.count, total_ms, slowest_ms,
+                               _shorten(stats.slowest_statement or ''))
+        return response
+
+
+query_instrumentation = QueryInstrumentation()
@@ -0,0 +1,61 @@
+"""maintain updated_at with triggers
+
+Revision ID: 3f2a9c61d8b4
+Revises: 11757385da68
+Create Date: 2026-10-16 19:02:41.508113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c61d8b4'
+down_revision = '11757385da68'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def _create_venue_directory(columns):
+    op.execute(f'''
+        CREATE MATERIALIZED VIEW venue_directory AS
+        SELECT {columns}, count(s.id) AS upcoming_shows_count
+        FROM "Venue" AS v
+        LEFT JOIN "Show" AS s ON s.venue_id = v.id AND s.start_time > now()
+        GROUP BY v.id
+    ''')
+    op.execute('CREATE UNIQUE INDEX ix_venue_directory_id ON venue_directory (id)')
+    op.execute('CREATE INDEX ix_venue_directory_city_state_name_id ON venue_directory (city, state, name, id)')
+
+
+def upgrade():
+    # the ORM's onupdate only covers writes made through SQLAlchemy; the trigger
+    # also stamps rows changed by hand or by other clients, which the
+    # conditional GET validators rely on.
+    op.execute('''
+        CREATE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at = now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in TABLES:
+        op.execute(f'CREATE TRIGGER set_updated_at BEFORE UPDATE ON "{table}" '
+                   f'FOR EACH ROW EXECUTE PROCEDURE set_updated_at()')
+
+    # the directory carries updated_at so the /venues validator reads the same
+    # snapshot the page is rendered from
+    op.execute('DROP MATERIALIZED VIEW venue_directory')
+    _create_venue_directory('v.id, v.name, v.city, v.state, v.updated_at')
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW venue_directory')
+    _create_venue_directory('v.id, v.name, v.city, v.state')
+
+    for table in TABLES:
+        op.execute(f'DROP TRIGGER set_updated_at ON "{table}"')
+    op.execute('DROP FUNCTION set_updated_at()')
@@ -0,0 +1,39 @@
+"""require the listing sort keys
+
+Revision ID: 5d1e8b7c2a94
+Revises: 3f2a9c61d8b4
+Create Date: 2026-10-16 21:14:07.662310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1e8b7c2a94'
+down_revision = '3f2a9c61d8b4'
+branch_labels = None
+depends_on = None
+
+# columns the keyset listings sort and compare on; a row-value comparison is
+# never true for a row with a NULL in it, so such rows fell out of every page
+# after the first
+COLUMNS = (
+    ('Venue', 'name', sa.String()),
+    ('Venue', 'city', sa.String(length=120)),
+    ('Venue', 'state', sa.String(length=120)),
+    ('Artist', 'name', sa.String()),
+)
+
+
+def upgrade():
+    for table, column, type_ in COLUMNS:
+        op.execute(f'UPDATE "{table}" SET {column} = \'\' WHERE {column} IS NULL')
+        op.alter_column(table, column, existing_type=type_, nullable=False)
+    # the directory copies the venue columns
+    op.execute('REFRESH MATERIALIZED VIEW venue_directory')
+
+
+def downgrade():
+    for table, column, type_ in reversed(COLUMNS):
+        op.alter_column(table, column, existing_type=type_, nullable=True)
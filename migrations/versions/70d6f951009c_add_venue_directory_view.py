@@ -0,0 +1,33 @@
+"""add venue directory materialized view
+
+Revision ID: 70d6f951009c
+Revises: b54b1c0f8e21
+Create Date: 2026-10-16 15:37:22.815430
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '70d6f951009c'
+down_revision = 'b54b1c0f8e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('''
+        CREATE MATERIALIZED VIEW venue_directory AS
+        SELECT v.id, v.name, v.city, v.state, count(s.id) AS upcoming_shows_count
+        FROM "Venue" AS v
+        LEFT JOIN "Show" AS s ON s.venue_id = v.id AND s.start_time > now()
+        GROUP BY v.id
+    ''')
+    # the unique index is what allows REFRESH ... CONCURRENTLY
+    op.execute('CREATE UNIQUE INDEX ix_venue_directory_id ON venue_directory (id)')
+    op.execute('CREATE INDEX ix_venue_directory_city_state_name_id ON venue_directory (city, state, name, id)')
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW venue_directory')
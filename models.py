@@ -1,18 +1,28 @@
 
-from flask_sqlalchemy import SQLAlchemy
+from replicas import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_city_state_name_id', 'city', 'state', 'name', 'id'),
+        db.Index('ix_venue_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_state_city', 'state', 'city'),
+        db.Index('ix_venue_seeking_talent_state_city', 'state', 'city',
+                 postgresql_where=db.text('seeking_talent')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    # name, city and state are keyset pagination keys, which can't be NULL
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -21,16 +31,35 @@ class Venue(db.Model):
     genres = db.Column(db.ARRAY(db.String), nullable=False)
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, server_default=db.func.now(), onupdate=db.func.now())
     shows = db.relationship('Show', backref='venue', lazy=True)
 
     # Completed: implement any missing fields, as a database migration using Flask-Migrate
 
 
+# expression index backing the earth_box() proximity search (cube/earthdistance)
+db.Index('ix_venue_earth_location', db.func.ll_to_earth(Venue.latitude, Venue.longitude), postgresql_using='gist')
+
+
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_state_city', 'state', 'city'),
+        db.Index('ix_artist_seeking_venue_state_city', 'state', 'city',
+                 postgresql_where=db.text('seeking_venue')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    # a keyset pagination key, which can't be NULL
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -40,6 +69,9 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, server_default=db.func.now(), onupdate=db.func.now())
     shows = db.relationship('Show', backref='artist', lazy=True)
 
 
@@ -48,11 +80,35 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_show_counted_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('counted_upcoming')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # which counter bucket (upcoming or past) this show is currently counted in
+    counted_upcoming = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, server_default=db.func.now(), onupdate=db.func.now())
 
 
 # Completed: Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+
+
+# Read-only directory of venues for the /venues page, a materialized view
+# refreshed by directory.py; declared as a lightweight table so that it stays
+# out of the metadata Alembic autogenerates from.
+venue_directory = db.table(
+    'venue_directory',
+    db.column('id', db.Integer),
+    db.column('name', db.String),
+    db.column('city', db.String),
+    db.column('state', db.String),
+    db.column('upcoming_shows_count', db.Integer),
+    db.column('updated_at', db.DateTime),
+)
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import request, url_for
+from sqlalchemy import tuple_
+
+
+# ----------------------------------------------------------------------------#
+# Keyset pagination.
+# ----------------------------------------------------------------------------#
+
+class Page(object):
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(values, direction):
+    # cursors are opaque to clients: the sort key of the boundary row plus the
+    # direction to walk from it, as url-safe base64 json.
+    payload = {
+        'k': [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        'd': direction,
+    }
+    token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    return token.decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    # returns (values, direction), or None when the token is malformed or stale
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values, direction = payload['k'], payload['d']
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            return None
+        values = [_key_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, KeyError, binascii.Error, NotImplementedError):
+        return None
+    return values, direction
+
+
+def _key_value(column, value):
+    # a tampered cursor must not reach the database with a value of the wrong
+    # type; raises TypeError unless value fits the column
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    # json true/false would pass as an int
+    if not isinstance(value, python_type) or (isinstance(value, bool) and python_type is not bool):
+        raise TypeError(f'{column.key} cursor value {value!r} is not {python_type.__name__}')
+    return value
+
+
+def paginate(query, columns, cursor, per_page):
+    # keyset pagination over `columns`, whose last element must be unique (the
+    # primary key) and none of which may be NULL: a row-value comparison with a
+    # NULL in it is never true, so the row would drop out of the listing. Each
+    # page is a row-value comparison plus LIMIT against an index on the same
+    # columns, so deep pages cost the same as the first one.
+    key = decode_cursor(cursor, columns) if cursor else None
+    backwards = key is not None and key[1] == 'prev'
+
+    if key is not None:
+        boundary = tuple_(*key[0])
+        query = query.filter(tuple_(*columns) < boundary if backwards else tuple_(*columns) > boundary)
+    order = [column.desc() for column in columns] if backwards else list(columns)
+
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    has_next = True if backwards else has_more
+    has_prev = has_more if backwards else key is not None
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns], 'next')
+    if rows and has_prev:
+        prev_cursor = encode_cursor([getattr(rows[0], column.key) for column in columns], 'prev')
+    return Page(rows, next_cursor, prev_cursor)
+
+
+def page_url(cursor):
+    # link to the current listing at another cursor, keeping any other filters
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **dict(request.view_args or {}, **args))
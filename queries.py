@@ -0,0 +1,332 @@
+from itertools import groupby
+from sqlalchemy import func, or_, literal, literal_column, union_all, case, cast, select, text, String, Date
+from models import db, Venue, Artist, Show, venue_directory
+from pagination import paginate
+
+
+# ----------------------------------------------------------------------------#
+# Read queries.
+# ----------------------------------------------------------------------------#
+
+def venue_regions(cursor, per_page, genre=None):
+    # one query per page against the venue_directory materialized view, ordered
+    # so that venues of the same city/state are adjacent and can be grouped in a
+    # single linear pass. Pages are keyed on (city, state, name, id) so a region
+    # stays contiguous across page boundaries.
+    directory = venue_directory.c
+    query = db.session.query(
+        directory.id, directory.name, directory.city, directory.state, directory.upcoming_shows_count
+    )
+    if genre:
+        # containment (@>) is answered by the GIN index on Venue.genres
+        query = query.filter(directory.id.in_(
+            db.session.query(Venue.id).filter(Venue.genres.contains([genre]))
+        ))
+    page = paginate(query, [directory.city, directory.state, directory.name, directory.id], cursor, per_page)
+
+    regions = []
+    for (city, state), venues in groupby(page.items, key=lambda row: (row.city, row.state)):
+        regions.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.upcoming_shows_count
+            } for venue in venues]
+        })
+    return regions, page
+
+
+def artist_listing(cursor, per_page, genre=None):
+    query = db.session.query(Artist.id, Artist.name)
+    if genre:
+        query = query.filter(Artist.genres.contains([genre]))
+    return paginate(query, [Artist.name, Artist.id], cursor, per_page)
+
+
+def genre_counts(model):
+    # number of venues/artists per genre, in one grouped query over the unnested
+    # arrays. It reads every row, so the listings take it through
+    # response_cache.memoize rather than once per render.
+    genres = db.session.query(func.unnest(model.genres).label('genre')).subquery()
+    return [tuple(row) for row in db.session.query(
+        genres.c.genre, func.count().label('count')
+    ).group_by(
+        genres.c.genre
+    ).order_by(
+        func.count().desc(), genres.c.genre
+    )]
+
+
+def _detail_version(model, show_fk, other, other_fk, entity_id):
+    # (last modified, show count, upcoming show count) over the entity, its shows
+    # and the other side of those shows; the upcoming count changes as shows
+    # pass even when no row does. None if the entity doesn't exist.
+    row = db.session.query(
+        func.greatest(func.max(model.updated_at), func.max(Show.updated_at), func.max(other.updated_at)),
+        func.count(Show.id),
+        func.count(Show.id).filter(Show.start_time > func.now())
+    ).select_from(model).outerjoin(
+        Show, show_fk == model.id
+    ).outerjoin(
+        other, other_fk == other.id
+    ).filter(
+        model.id == entity_id
+    ).group_by(model.id).first()
+    return tuple(row) if row else None
+
+
+def venue_version(venue_id):
+    return _detail_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id)
+
+
+def artist_version(artist_id):
+    return _detail_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id)
+
+
+def _filter_shows(query, window):
+    # window: optional start/end (end exclusive) and venue_id/artist_id; each
+    # combination is a range scan on (start_time, id), (venue_id, start_time) or
+    # (artist_id, start_time)
+    if window.get('start'):
+        query = query.filter(Show.start_time >= window['start'])
+    if window.get('end'):
+        query = query.filter(Show.start_time < window['end'])
+    if window.get('venue_id'):
+        query = query.filter(Show.venue_id == window['venue_id'])
+    if window.get('artist_id'):
+        query = query.filter(Show.artist_id == window['artist_id'])
+    return query
+
+
+def _show_listing_query(window):
+    # shows with their artist and venue names joined in the same query
+    return _filter_shows(db.session.query(
+        Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+        Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')
+    ).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ), window)
+
+
+def _show_listing_row(show):
+    return {
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time
+    }
+
+
+def show_listing(cursor, per_page, window):
+    page = paginate(_show_listing_query(window), [Show.start_time, Show.id], cursor, per_page)
+    page.items = [_show_listing_row(show) for show in page.items]
+    return page
+
+
+def iter_show_listing(batch_size, window):
+    # every show, read through a server-side cursor batch_size rows at a time so
+    # memory stays flat however large the table is.
+    query = _show_listing_query(window).order_by(Show.start_time, Show.id).yield_per(batch_size)
+    for show in query:
+        yield _show_listing_row(show)
+
+
+def show_day_counts(window):
+    # number of shows per calendar day in the window, from one aggregated query
+    day = cast(func.date_trunc('day', Show.start_time), Date).label('day')
+    return dict(_filter_shows(
+        db.session.query(day, func.count(Show.id)), window
+    ).group_by(day).all())
+
+
+def _partition_shows(detail, rows, prefix):
+    # rows carry their own partition flag and the per-partition count computed by
+    # the window function, so no len() over ORM objects is needed.
+    detail['past_shows'] = []
+    detail['upcoming_shows'] = []
+    detail['past_shows_count'] = 0
+    detail['upcoming_shows_count'] = 0
+    for row in rows:
+        key = 'upcoming' if row.is_upcoming else 'past'
+        detail[key + '_shows'].append({
+            prefix + '_id': row.id,
+            prefix + '_name': row.name,
+            prefix + '_image_link': row.image_link,
+            'start_time': row.start_time
+        })
+        detail[key + '_shows_count'] = row.partition_count
+    return detail
+
+
+def _detail_shows(show_fk, entity_id, other, other_fk):
+    # a single query returning the entity's shows joined to the other side, each
+    # flagged past/upcoming against the database clock.
+    is_upcoming = Show.start_time > func.now()
+    return db.session.query(
+        other.id, other.name, other.image_link, Show.start_time,
+        is_upcoming.label('is_upcoming'),
+        func.count(Show.id).over(partition_by=is_upcoming).label('partition_count')
+    ).join(
+        other, other_fk == other.id
+    ).filter(
+        show_fk == entity_id
+    ).order_by(
+        Show.start_time
+    ).all()
+
+
+def venue_detail(venue_id):
+    venue = Venue.query.get(venue_id)
+    if not venue:
+        return None
+
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+    }
+    return _partition_shows(data, _detail_shows(Show.venue_id, venue_id, Artist, Show.artist_id), 'artist')
+
+
+def artist_detail(artist_id):
+    artist = Artist.query.get(artist_id)
+    if not artist:
+        return None
+
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+    }
+    return _partition_shows(data, _detail_shows(Show.artist_id, artist_id, Venue, Show.venue_id), 'venue')
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _name_match(model, term):
+    # (filter, ranking) for a name search: substring matches and trigram-similar
+    # names (typos) are both served by the gin_trgm_ops index on name; substring
+    # hits rank first, then by similarity.
+    substring = model.name.ilike(f'%{_escape_like(term)}%', escape='\\')
+    similar = model.name.op('%')(term)
+    return or_(substring, similar), [substring.desc(), func.similarity(model.name, term).desc()]
+
+
+def name_search(model, term, limit):
+    match, ranking = _name_match(model, term.strip())
+    return db.session.query(
+        model.id, model.name, model.upcoming_shows_count
+    ).filter(
+        match
+    ).order_by(
+        *ranking, model.name, model.id
+    ).limit(limit).all()
+
+
+def existing_show_references(venue_ids, artist_ids):
+    # which of the given venue and artist ids exist, checked in one query;
+    # returns (venue_id_set, artist_id_set).
+    venue_ids, artist_ids = list(venue_ids), list(artist_ids)
+    if not venue_ids and not artist_ids:
+        return set(), set()
+    rows = db.session.execute(union_all(
+        db.session.query(literal('venue').label('kind'), Venue.id).filter(Venue.id.in_(venue_ids)).statement,
+        db.session.query(literal('artist').label('kind'), Artist.id).filter(Artist.id.in_(artist_ids)).statement,
+    )).fetchall()
+    return ({entity_id for kind, entity_id in rows if kind == 'venue'},
+            {entity_id for kind, entity_id in rows if kind == 'artist'})
+
+
+def faceted_search(model, seeking_column, term, filters, limit):
+    # matching rows plus per-facet counts (state, city, genre, seeking) over the
+    # same match set. The facets come back from one statement: GROUPING SETS
+    # for the scalar columns and the total, UNION ALL an unnest for genres.
+    query = db.session.query(model)
+    ranking = []
+    term = (term or '').strip()
+    if term:
+        match, ranking = _name_match(model, term)
+        query = query.filter(match)
+    if filters.get('state'):
+        query = query.filter(model.state == filters['state'])
+    if filters.get('city'):
+        query = query.filter(model.city == filters['city'])
+    if filters.get('genre'):
+        query = query.filter(model.genres.contains([filters['genre']]))
+    if filters.get('seeking') is not None:
+        query = query.filter(seeking_column == filters['seeking'])
+
+    results = query.with_entities(
+        model.id, model.name, model.city, model.state, model.genres, seeking_column, model.upcoming_shows_count
+    ).order_by(*ranking, model.name, model.id).limit(limit).all()
+
+    matches = query.with_entities(
+        model.state, model.city, model.genres, cast(seeking_column, String).label('seeking')
+    ).cte('matches')
+    state, city, seeking = matches.c.state, matches.c.city, matches.c.seeking
+    grouped_by = [(state, 'state'), (city, 'city'), (seeking, 'seeking')]
+    scalar_facets = select([
+        case([(func.grouping(column) == 0, literal_column(f"'{name}'")) for column, name in grouped_by],
+             else_=literal_column("'total'")).label('facet'),
+        case([(func.grouping(column) == 0, cast(column, String)) for column, name in grouped_by]).label('value'),
+        func.count().label('count'),
+    ]).group_by(func.grouping_sets(state, city, seeking, text('()')))
+
+    genres = select([func.unnest(matches.c.genres).label('genre')]).alias('genres')
+    genre_facet = select([
+        literal_column("'genre'").label('facet'), genres.c.genre.label('value'), func.count().label('count'),
+    ]).group_by(genres.c.genre)
+
+    facets = {'state': {}, 'city': {}, 'genre': {}, 'seeking': {}}
+    total = 0
+    for facet, value, count in db.session.execute(union_all(scalar_facets, genre_facet)):
+        if facet == 'total':
+            total = count
+        elif value is not None:
+            facets[facet][value] = count
+    return total, results, facets
+
+
+def nearby_venues(latitude, longitude, radius_km, limit):
+    # nearest venues within radius_km. earth_box() @> ll_to_earth() is a bounding
+    # cube answered by the GiST index, so only venues inside it are measured;
+    # earth_distance() then trims the cube's corners and orders the rest.
+    origin = func.ll_to_earth(latitude, longitude)
+    location = func.ll_to_earth(Venue.latitude, Venue.longitude)
+    distance = func.earth_distance(origin, location)
+    radius = radius_km * 1000.0
+    return db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+        Venue.upcoming_shows_count, (distance / 1000.0).label('distance_km')
+    ).filter(
+        func.earth_box(origin, radius).op('@>')(location)
+    ).filter(
+        distance <= radius
+    ).order_by(
+        distance, Venue.id
+    ).limit(limit).all()
@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm, text
+
+
+# ----------------------------------------------------------------------------#
+# Read-replica routing.
+# ----------------------------------------------------------------------------#
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# session key holding the time until which this client reads from the primary
+STICKY_KEY = '_primary_until'
+
+# replication lag in seconds; 0 on a server that isn't in recovery, so a second
+# connection to the primary can stand in for a replica
+LAG_QUERY = text('''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+''')
+
+
+class RoutingSession(SignallingSession):
+    # sends the statements of a read request to the replica picked for it;
+    # flushes, and everything outside a read request, go to the primary
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_request_context():
+            engine = g.get('replica_engine')
+            if engine is not None:
+                return engine
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class Replica(object):
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False
+        self.lag = None
+        self.error = None
+
+    def check(self, max_lag):
+        try:
+            with self.engine.connect() as connection:
+                self.lag = float(connection.execute(LAG_QUERY).scalar())
+            self.error = None
+        except Exception as e:
+            self.lag = None
+            self.error = str(e).strip().splitlines()[0]
+        healthy = self.error is None and self.lag <= max_lag
+        changed = healthy != self.healthy
+        self.healthy = healthy
+        return changed
+
+
+class ReplicaRouter(object):
+    # routes read requests to a healthy replica from SQLALCHEMY_REPLICA_URIS.
+    # A client that has just written reads from the primary for
+    # REPLICA_STICKY_SECONDS so it sees its own changes. A background check
+    # every REPLICA_CHECK_INTERVAL seconds evicts replicas that fail to answer
+    # or lag more than REPLICA_MAX_LAG_SECONDS and readmits them once they
+    # recover. With no replica available, reads go to the primary.
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self._checker = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 5)
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 5)
+        self.app = app
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.check_interval = app.config['REPLICA_CHECK_INTERVAL']
+
+        engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        self.replicas = [
+            Replica(uri.rsplit('@', 1)[-1], create_engine(uri, **engine_options))
+            for uri in app.config['SQLALCHEMY_REPLICA_URIS']
+        ]
+        if not self.replicas:
+            return
+
+        db = app.extensions['sqlalchemy'].db
+        event.listen(db.session, 'after_commit', _record_write)
+        app.before_request(self._route)
+        app.after_request(self._stick)
+
+    @property
+    def engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def check(self):
+        for replica in self.replicas:
+            if replica.check(self.max_lag):
+                if replica.healthy:
+                    self.app.logger.warning('replica %s readmitted (lag %.1fs)', replica.name, replica.lag)
+                else:
+                    self.app.logger.warning('replica %s evicted: %s', replica.name,
+                                            replica.error or f'lag {replica.lag:.1f}s')
+
+    def _check_forever(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                self.app.logger.exception('replica health check failed')
+            time.sleep(self.check_interval)
+
+    def _start_checker(self):
+        # started from the first request rather than init_app so that it runs in
+        # the serving process, not in a parent that forks workers
+        with self._lock:
+            if self._checker is not None:
+                return
+            self.check()
+            self._checker = threading.Thread(target=self._check_forever, daemon=True)
+            self._checker.start()
+
+    def pick(self):
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        return random.choice(healthy).engine if healthy else None
+
+    def _route(self):
+        if self._checker is None:
+            self._start_checker()
+        if request.method not in READ_METHODS:
+            return
+        if session.get(STICKY_KEY, 0) > time.time():
+            # a cached page may have been rendered from a replica behind the write
+            g.skip_response_cache = True
+        else:
+            g.replica_engine = self.pick()
+
+    def _stick(self, response):
+        if g.pop('wrote', False):
+            session[STICKY_KEY] = time.time() + self.sticky_seconds
+        return response
+
+
+def _record_write(db_session):
+    if has_request_context():
+        g.wrote = True
+
+
+replica_router = ReplicaRouter()
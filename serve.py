@@ -0,0 +1,58 @@
+import argparse
+import os
+
+
+# ----------------------------------------------------------------------------#
+# Production server.
+# ----------------------------------------------------------------------------#
+
+# Flask 1.1 and SQLAlchemy 1.3 have no async views or async engine, so the read
+# path is made cooperative instead: gevent patches the standard library and
+# psycogreen makes psycopg2 yield to other greenlets while it waits on
+# PostgreSQL. One process then keeps many requests in flight at once, each with
+# its own scoped session (Flask-SQLAlchemy scopes sessions per greenlet), and
+# the views stay as they are. --threaded serves the same app with a thread per
+# request instead, as the baseline for benchmarks/concurrency.py.
+
+
+def serve_cooperative(host, port, max_connections):
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+    from app import app
+
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections), log=None)
+    print(f'Serving on http://{host}:{port} (gevent, up to {max_connections} connections)')
+    server.serve_forever()
+
+
+def serve_threaded(host, port):
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server(host, port, app, threaded=True)
+    print(f'Serving on http://{host}:{port} (thread per request)')
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the app with cooperative database I/O.')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--max-connections', type=int, default=1000,
+                        help='concurrent connections handled by one process')
+    parser.add_argument('--threaded', action='store_true', help='serve with a thread per request instead')
+    args = parser.parse_args()
+
+    if args.threaded:
+        serve_threaded(args.host, args.port)
+    else:
+        serve_cooperative(args.host, args.port, args.max_connections)
+
+
+if __name__ == '__main__':
+    main()
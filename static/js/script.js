@@ -2,3 +2,36 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// navbar search suggestions from /autocomplete; picking a suggestion opens its page
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var urls = {};
+  var pending = null;
+  input.addEventListener('input', function () {
+    if (urls[input.value]) {
+      window.location = urls[input.value];
+      return;
+    }
+    clearTimeout(pending);
+    pending = setTimeout(function () {
+      var query = input.value.trim();
+      if (!query) {
+        list.innerHTML = '';
+        return;
+      }
+      fetch('/autocomplete?kind=' + input.dataset.autocomplete + '&q=' + encodeURIComponent(query))
+        .then(function (response) { return response.json(); })
+        .then(function (body) {
+          urls = {};
+          list.innerHTML = '';
+          body.data.forEach(function (match) {
+            var option = document.createElement('option');
+            option.value = match.name;
+            urls[match.name] = match.url;
+            list.appendChild(option);
+          });
+        });
+    }, 100);
+  });
+});